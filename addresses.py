@@ -0,0 +1,125 @@
+import hashlib
+import logging
+
+import click
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from cache import bump_data_version
+from geo import normalize_address
+from models import Address, Order, ArchivedOrder
+
+DEFAULT_BATCH_SIZE = 1000
+
+def address_key(city, normalized):
+    return hashlib.sha256(f'{city or ""}|{normalized}'.encode()).hexdigest()
+
+def insert_missing(values):
+    """INSERT of an address that does nothing when its key already exists"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(Address).values(**values).on_conflict_do_nothing(index_elements=['key'])
+    if dialect == 'sqlite':
+        return sqlite.insert(Address).values(**values).on_conflict_do_nothing(index_elements=['key'])
+    return insert(Address).values(**values)
+
+def resolve_address(text, known=None):
+    """(address id, city) of a free text address, adding it to the dictionary if new.
+
+    Concurrent requests with the same address race on the unique key,
+    the loser's insert does nothing and both read the same row. `known`
+    is an optional dict of already resolved keys for bulk runs.
+    """
+    city, normalized = normalize_address(text)
+    key = address_key(city, normalized)
+    if known is not None and key in known:
+        return known[key], city
+
+    address_id = db.session.execute(select(Address.id).where(Address.key == key)).scalar()
+    if address_id is None:
+        db.session.execute(insert_missing({
+            'key': key,
+            'city': city,
+            'normalized': normalized,
+            'text': ' '.join(text.split()),
+        }))
+        address_id = db.session.execute(select(Address.id).where(Address.key == key)).scalar_one()
+
+    if known is not None:
+        known[key] = address_id
+    return address_id, city
+
+def address_columns(pickup_address, delivery_address, known=None):
+    """Address ids and lane cities of an order, as Order column values"""
+    pickup_id, origin = resolve_address(pickup_address, known)
+    delivery_id, destination = resolve_address(delivery_address, known)
+    return {
+        'pickup_address_id': pickup_id,
+        'delivery_address_id': delivery_id,
+        'origin_city': origin,
+        'destination_city': destination,
+    }
+
+def set_order_addresses(order, pickup_address, delivery_address):
+    """Link a new order to the dictionary entries of its addresses and its lane.
+
+    The text is only stored in the dictionary; the records are attached
+    as well, so the addresses can be read before the order is flushed.
+    """
+    for name, value in address_columns(pickup_address, delivery_address).items():
+        setattr(order, name, value)
+    order.pickup_address_record = db.session.get(Address, order.pickup_address_id)
+    order.delivery_address_record = db.session.get(Address, order.delivery_address_id)
+
+def backfill_addresses(batch_size=DEFAULT_BATCH_SIZE):
+    """Move the free text addresses of live and archived orders into the dictionary.
+
+    Orders that still hold address text get their address ids and lane,
+    and the text columns are cleared, as the dictionary now holds it.
+    Works in primary key batches with one UPDATE per batch; returns the
+    number of orders updated. updated_at is written back unchanged, so the
+    backfill does not push every order through the change feed.
+    """
+    known = {}
+    total = 0
+    for model in (Order, ArchivedOrder):
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, model.pickup_address_text, model.delivery_address_text, model.updated_at)
+                .where(model.pickup_address_text.isnot(None), model.id > last_id)
+                .order_by(model.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(update(model), [
+                {
+                    'id': row.id,
+                    # Explicit, or the column's onupdate would set it to now
+                    'updated_at': row.updated_at,
+                    **address_columns(row.pickup_address_text, row.delivery_address_text, known),
+                    'pickup_address_text': None,
+                    'delivery_address_text': None,
+                }
+                for row in rows
+            ])
+            db.session.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+            logging.info(f"Normalized addresses of {total} orders")
+    if total:
+        bump_data_version()
+    return total
+
+def init_addresses(app):
+    """Register the address backfill CLI command"""
+
+    @app.cli.command('normalize-addresses')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help='Orders normalized per transaction.')
+    def normalize_addresses_command(batch_size):
+        """Move order addresses into the address dictionary and set lanes."""
+        total = backfill_addresses(batch_size)
+        addresses = db.session.query(Address).count()
+        click.echo(f"Normalized {total} orders, {addresses} distinct addresses")
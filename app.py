@@ -7,6 +7,9 @@ from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from compression import CompressionMiddleware
+from replica import RoutingSession
+from sqlite_profile import is_sqlite_file_url, sqlite_engine_options
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,7 +17,7 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
@@ -22,21 +25,83 @@ csrf = CSRFProtect()
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = CompressionMiddleware(
+    app.wsgi_app,
+    min_size=int(os.environ.get("COMPRESS_MIN_SIZE", "500")),
+    level=int(os.environ.get("COMPRESS_LEVEL", "6")),
+)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///xpom_kz.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# SQLite files get WAL, a busy timeout and a matching pool (see sqlite_profile.py)
+def engine_options(url):
+    if is_sqlite_file_url(url):
+        return sqlite_engine_options()
+    return {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+
+# Optional read replica for read-only admin and report pages
+replica_url = os.environ.get("DATABASE_REPLICA_URL")
+if replica_url:
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica": {"url": replica_url, **engine_options(replica_url)},
+    }
+# Seconds a client keeps reading from the primary after its own write
+app.config["DATABASE_REPLICA_STICKY_SECONDS"] = float(os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", "10"))
+# Fall back to the primary while the replica lags more than this (0 = never check)
+app.config["DATABASE_REPLICA_MAX_LAG"] = float(os.environ.get("DATABASE_REPLICA_MAX_LAG", "0"))
+
+# Template caching: rendered admin fragments and compiled Jinja bytecode
+app.config["FRAGMENT_CACHE_TIMEOUT"] = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", "60"))
+app.config["JINJA_BYTECODE_CACHE_DIR"] = os.environ.get(
+    "JINJA_BYTECODE_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache")
+)
+
+# Batch tracking API: tracking numbers per request and requests per client per minute
+app.config["TRACKING_API_MAX_NUMBERS"] = int(os.environ.get("TRACKING_API_MAX_NUMBERS", "300"))
+app.config["TRACKING_API_RATE_LIMIT"] = int(os.environ.get("TRACKING_API_RATE_LIMIT", "30"))
+
+# Public order form and tracking page: requests per IP and minute per worker
+# (or across workers with RATE_LIMIT_REDIS_URL), and requests in progress
+# per worker beyond which they are turned away with 503 (0 = never). A worker
+# never runs more requests than gunicorn's --threads (8 in .replit), so the
+# limit stays below that and keeps threads free for logists
+app.config["SUBMIT_ORDER_RATE_LIMIT"] = int(os.environ.get("SUBMIT_ORDER_RATE_LIMIT", "10"))
+app.config["SUBMIT_ORDER_RATE_BURST"] = int(os.environ.get("SUBMIT_ORDER_RATE_BURST", "5"))
+app.config["TRACK_RESULT_RATE_LIMIT"] = int(os.environ.get("TRACK_RESULT_RATE_LIMIT", "60"))
+app.config["RATE_LIMIT_REDIS_URL"] = os.environ.get("RATE_LIMIT_REDIS_URL")
+app.config["LOAD_SHED_MAX_IN_FLIGHT"] = int(os.environ.get("LOAD_SHED_MAX_IN_FLIGHT", "6"))
+
+# Milliseconds between stack samples of a profiled request (X-Profile / ?_profile)
+app.config["PROFILE_INTERVAL_MS"] = float(os.environ.get("PROFILE_INTERVAL_MS", "2"))
+
+# Bearer token for the /api/changes order feed (unset = logists only)
+app.config["CHANGE_FEED_TOKEN"] = os.environ.get("CHANGE_FEED_TOKEN")
+
+# Seconds between in-process overdue sweeps of a worker (0 = only `flask sweep-overdue`)
+app.config["SLA_SWEEP_INTERVAL"] = int(os.environ.get("SLA_SWEEP_INTERVAL", "600"))
+
+# Financial reports over longer ranges run as background jobs (see report_jobs.py)
+app.config["REPORT_INLINE_DAYS"] = int(os.environ.get("REPORT_INLINE_DAYS", "92"))
+app.config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", "2"))
+# Seconds a request waits for a new job before showing the progress page
+app.config["REPORT_WAIT_SECONDS"] = float(os.environ.get("REPORT_WAIT_SECONDS", "2"))
 
 # Initialize extensions
 db.init_app(app)
 login_manager.init_app(app)
 csrf.init_app(app)
 
+from cache import init_template_cache
+init_template_cache(app)
+
 # CSRF exemptions for public forms
 csrf.exempt('routes.track_result')
+csrf.exempt('routes.api_track')
 
 # Configure Flask-Login
 login_manager.login_view = 'login'
@@ -53,6 +118,10 @@ with app.app_context():
     import models
     db.create_all()
     
+    # Add columns/indexes introduced after the tables were created
+    from schema import upgrade_schema
+    upgrade_schema(db)
+    
     # Create default admin user if not exists
     from models import User
     from werkzeug.security import generate_password_hash
@@ -69,8 +138,58 @@ with app.app_context():
         db.session.add(admin_user)
         db.session.commit()
         logging.info("Default admin user created: admin@xpom-kz.com / admin123")
+    
+    # Create default tariffs if the rate table is empty
+    from tariffs import seed_default_tariffs
+    seed_default_tariffs()
+    
+    # Fill the driver stats rollup for databases created before it existed
+    from models import Order, DriverDailyStats
+    if not DriverDailyStats.query.first() and Order.query.first():
+        from rollups import rebuild_driver_stats
+        rebuild_driver_stats()
 
 # Import routes and register template filters
 import routes
 from utils import register_template_filters
 register_template_filters(app)
+
+# Fingerprinted static assets (built with `flask --app main collect-assets`)
+from assets import init_assets
+init_assets(app)
+
+from tariffs import init_tariffs
+init_tariffs(app)
+
+from rollups import init_rollups
+init_rollups(app)
+
+from archive import init_archive
+init_archive(app)
+
+from replica import init_replica
+init_replica(app)
+
+from sqlite_profile import init_sqlite
+init_sqlite(app)
+
+from parquet_export import init_parquet_export
+init_parquet_export(app)
+
+from sla import init_sla
+init_sla(app)
+
+from consolidation import init_consolidation
+init_consolidation(app)
+
+from report_jobs import init_report_jobs
+init_report_jobs(app)
+
+from ratelimit import init_ratelimit
+init_ratelimit(app)
+
+from addresses import init_addresses
+init_addresses(app)
+
+from profiler import init_profiler
+init_profiler(app)
@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import and_, delete, insert, select
+
+from app import db
+from cache import bump_data_version
+from models import Order, OrderStatusHistory, ArchivedOrder, ArchivedOrderStatusHistory, ORDER_DETAIL_OPTIONS
+
+# Closed orders untouched for this many days are moved to the archive
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+CLOSED_STATUSES = ['delivered', 'cancelled']
+
+def copy_rows(source, target, where):
+    """INSERT INTO target SELECT <same columns> FROM source WHERE ..."""
+    names = [column.name for column in source.columns]
+    return insert(target).from_select(
+        names, select(*[source.c[name] for name in names]).where(where)
+    )
+
+def archive_closed_orders(days=DEFAULT_ARCHIVE_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE):
+    """Move orders closed more than `days` ago, with their status history, to the archive.
+
+    Each batch is copied and deleted in its own short transaction so the
+    order table is never locked for long. The selected orders are locked
+    until the batch commits (rows locked by a concurrent edit are skipped),
+    and the copy and delete statements repeat the closed and cutoff
+    conditions, so an order reopened or edited meanwhile stays live.
+    Returns the number of archived orders. The driver stats rollup is left untouched, as archived orders
+    still count towards it.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    orders = Order.__table__
+    history = OrderStatusHistory.__table__
+    archived = 0
+
+    archivable = and_(orders.c.status.in_(CLOSED_STATUSES), orders.c.updated_at < cutoff)
+    last_id = 0
+
+    while True:
+        ids = [
+            order_id for (order_id,) in db.session.execute(
+                select(orders.c.id).where(archivable, orders.c.id > last_id)
+                .order_by(orders.c.id).limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ]
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        # Orders that changed since the select are left out of every step
+        batch = and_(orders.c.id.in_(ids), archivable)
+        moved = db.session.execute(copy_rows(orders, ArchivedOrder.__table__, batch)).rowcount
+        in_batch = history.c.order_id.in_(select(orders.c.id).where(batch))
+        db.session.execute(copy_rows(history, ArchivedOrderStatusHistory.__table__, in_batch))
+        db.session.execute(delete(history).where(in_batch))
+        db.session.execute(delete(orders).where(batch))
+        db.session.commit()
+
+        archived += moved
+        logging.info(f"Archived {moved} orders (total {archived})")
+
+    if archived:
+        db.session.expire_all()
+        bump_data_version()
+    return archived
+
+def find_order_by_tracking_number(tracking_number):
+    """Live order with the tracking number, falling back to the archive"""
+    return (
+        Order.query.options(*ORDER_DETAIL_OPTIONS).filter_by(tracking_number=tracking_number).first()
+        or ArchivedOrder.query.options(*ORDER_DETAIL_OPTIONS).filter_by(tracking_number=tracking_number).first()
+    )
+
+def find_tracking_rows(tracking_numbers, columns):
+    """`columns` of the orders with the given tracking numbers, live or archived.
+
+    One IN query on the unique tracking_number index of the live table,
+    and one on the archive only for the numbers that were not found.
+    """
+    rows = {}
+    for model in (Order, ArchivedOrder):
+        missing = [number for number in tracking_numbers if number not in rows]
+        if not missing:
+            break
+        query = db.session.query(*[getattr(model, name) for name in columns]).filter(
+            model.tracking_number.in_(missing)
+        )
+        for row in query:
+            rows[row.tracking_number] = row
+    return rows
+
+def init_archive(app):
+    """Register the archival CLI command"""
+
+    @app.cli.command('archive-orders')
+    @click.option('--days', default=DEFAULT_ARCHIVE_AFTER_DAYS, show_default=True,
+                  help='Archive orders closed more than this many days ago.')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help='Orders moved per transaction.')
+    def archive_orders_command(days, batch_size):
+        """Move old delivered/cancelled orders into the archive tables."""
+        count = archive_closed_orders(days, batch_size)
+        click.echo(f"Archived {count} orders")
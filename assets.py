@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+import requests
+import rjsmin
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+# Third-party assets vendored into static/ by `flask collect-assets`.
+# Until they are collected, templates keep loading them from the CDN.
+VENDOR_ASSETS = {
+    'vendor/bootstrap/css/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/chartjs/chart.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+    'vendor/fullcalendar/index.global.min.js': 'https://cdn.jsdelivr.net/npm/fullcalendar@6.1.8/index.global.min.js',
+    'vendor/fullcalendar/locales/ru.global.min.js': 'https://cdn.jsdelivr.net/npm/fullcalendar@6.1.8/locales/ru.global.min.js',
+    'vendor/fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+}
+
+FONT_AWESOME_WEBFONTS = ['fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility']
+for _font in FONT_AWESOME_WEBFONTS:
+    for _ext in ('woff2', 'ttf'):
+        VENDOR_ASSETS[f'vendor/fontawesome/webfonts/{_font}.{_ext}'] = (
+            f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/{_font}.{_ext}'
+        )
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.json', '.txt')
+COMPRESS_MIN_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_manifest = {}
+
+def minify_css(text):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """Strip comments and redundant whitespace from a script.
+
+    rjsmin tokenizes strings, template literals and regular expressions,
+    so their contents are left untouched.
+    """
+    return rjsmin.jsmin(text) + '\n'
+
+def rewrite_css_urls(text, name, manifest):
+    """Point url(...) references in a stylesheet at their fingerprinted files"""
+    base_dir = posixpath.dirname(name)
+
+    def replace(match):
+        quote, ref = match.group(1), match.group(2)
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+        target = posixpath.normpath(posixpath.join(base_dir, path))
+        if target not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[target], base_dir)
+        return f'url({quote}{hashed}{suffix}{quote})'
+
+    return CSS_URL_RE.sub(replace, text)
+
+def fingerprint(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = posixpath.splitext(name)
+    return f'{stem}.{digest}{ext}'
+
+def write_compressed_variants(path, content):
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS) or len(content) < COMPRESS_MIN_SIZE:
+        return
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+def download_vendor_assets(static_folder):
+    """Fetch third-party assets that are not yet present under static/vendor"""
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(static_folder, name)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        logging.info(f"Vendored {url} -> {name}")
+
+def collect_assets(static_folder):
+    """Minify, fingerprint and precompress static files into static/dist.
+
+    Returns the manifest mapping logical names to fingerprinted names.
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    if os.path.exists(dist_folder):
+        shutil.rmtree(dist_folder)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for filename in files:
+            rel = os.path.relpath(os.path.join(root, filename), static_folder)
+            names.append(rel.replace(os.sep, '/'))
+
+    # Stylesheets go last so their url() references can be rewritten
+    names.sort(key=lambda n: (n.endswith('.css'), n))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+
+        own_asset = not name.startswith('vendor/')
+        if name.endswith('.css'):
+            text = content.decode('utf-8')
+            if own_asset:
+                text = minify_css(text)
+            content = rewrite_css_urls(text, name, manifest).encode('utf-8')
+        elif name.endswith('.js') and own_asset:
+            content = minify_js(content.decode('utf-8')).encode('utf-8')
+
+        hashed = fingerprint(name, content)
+        path = os.path.join(dist_folder, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        write_compressed_variants(path, content)
+        manifest[name] = hashed
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+def load_manifest(static_folder):
+    global _manifest
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {}
+    return _manifest
+
+def asset_url(name):
+    """URL of a static asset, fingerprinted when it has been collected"""
+    hashed = _manifest.get(name)
+    if hashed:
+        return url_for('static_asset', filename=hashed)
+    if name in VENDOR_ASSETS:
+        return VENDOR_ASSETS[name]
+    return url_for('static', filename=name)
+
+def init_assets(app):
+    """Register the fingerprinted asset route, template helper and CLI command"""
+    dist_folder = os.path.join(app.static_folder, DIST_DIR)
+    load_manifest(app.static_folder)
+
+    @app.route('/assets/<path:filename>')
+    def static_asset(filename):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.exists(os.path.join(dist_folder, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+
+        response = send_from_directory(dist_folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.add_template_global(asset_url)
+
+    @app.cli.command('collect-assets')
+    @click.option('--offline', is_flag=True, help='Do not download missing vendor assets.')
+    def collect_assets_command(offline):
+        """Vendor, minify, fingerprint and precompress static assets."""
+        if not offline:
+            download_vendor_assets(app.static_folder)
+        manifest = collect_assets(app.static_folder)
+        load_manifest(app.static_folder)
+        click.echo(f"Collected {len(manifest)} assets into {dist_folder}")
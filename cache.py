@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Default lifetime of a cached fragment in seconds. The data version only
+# tracks writes made by this worker, so the timeout bounds how stale a
+# fragment can get when another gunicorn worker changes an order.
+DEFAULT_TIMEOUT = 60
+MAX_ENTRIES = 512
+
+class FragmentCache:
+    """Small in-process LRU cache for rendered fragments and derived data.
+
+    Keys are built from explicit key parts plus the current data version,
+    so every order write makes the previous entries unreachable.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_entries=MAX_ENTRIES):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump_version(self):
+        with self._lock:
+            self.version += 1
+
+    def make_key(self, key_parts):
+        return tuple(key_parts) + (self.version,)
+
+    def get_or_set(self, key_parts, factory, timeout=None):
+        """Return the cached value for key_parts, calling factory() on a miss"""
+        key = self.make_key(key_parts)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = factory()
+        expires = now + (timeout if timeout is not None else self.timeout)
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fragment_cache = FragmentCache()
+
+def bump_data_version():
+    """Invalidate cached fragments after writes that bypass the ORM session"""
+    fragment_cache.bump_version()
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag caching the rendered body under explicit keys.
+
+    Usage::
+
+        {% cache 'dashboard', 'stats' %}
+            ...
+        {% endcache %}
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render_cached', [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        return Markup(fragment_cache.get_or_set(['fragment'] + key_parts, caller))
+
+def _order_models():
+    from models import Order, OrderStatusHistory
+    return (Order, OrderStatusHistory)
+
+@event.listens_for(Session, 'after_flush')
+def _track_order_writes(session, flush_context):
+    tracked = _order_models()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, tracked):
+            session.info['orders_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    if session.info.pop('orders_changed', False):
+        bump_data_version()
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_on_rollback(session):
+    session.info.pop('orders_changed', None)
+
+def init_template_cache(app):
+    """Enable the fragment cache tag and the persistent Jinja bytecode cache.
+
+    Must run before the first template is loaded, otherwise already compiled
+    templates bypass the bytecode cache.
+    """
+    fragment_cache.timeout = app.config.get('FRAGMENT_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select
+
+from app import db
+from models import Order, table_columns
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Rows younger than this are held back: updated_at is set at flush time,
+# so a transaction may still commit an older timestamp for a few moments.
+SETTLE_SECONDS = 5
+
+def encode_cursor(updated_at, order_id):
+    raw = f'{updated_at.isoformat()}|{order_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(updated_at, id) of a cursor; raises ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, order_id = raw.split('|')
+        return datetime.fromisoformat(updated_at), int(order_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def fetch_changes(cursor=None, limit=DEFAULT_LIMIT, settle_seconds=SETTLE_SECONDS):
+    """Orders created or modified after the cursor, oldest change first.
+
+    Pages walk the (updated_at, id) index in a stable order. Returns
+    (orders, next_cursor, has_more); next_cursor equals the given cursor
+    when nothing changed, so clients can keep polling with it.
+    """
+    orders = Order.__table__
+    query = select(*table_columns(orders)).where(
+        orders.c.updated_at <= datetime.utcnow() - timedelta(seconds=settle_seconds)
+    )
+    if cursor:
+        updated_at, order_id = decode_cursor(cursor)
+        query = query.where(or_(
+            orders.c.updated_at > updated_at,
+            and_(orders.c.updated_at == updated_at, orders.c.id > order_id)
+        ))
+
+    rows = db.session.execute(
+        query.order_by(orders.c.updated_at, orders.c.id).limit(limit + 1)
+    ).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        cursor = encode_cursor(rows[-1]['updated_at'], rows[-1]['id'])
+    return [{name: serialize(value) for name, value in row.items()} for row in rows], cursor, has_more
@@ -0,0 +1,212 @@
+import itertools
+import zlib
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:  # only gzip is offered without the brotli package
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'text/xml',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+}
+
+class CompressionMiddleware:
+    """WSGI middleware compressing responses with brotli or gzip.
+
+    The encoding is negotiated from Accept-Encoding. Bodies are compressed
+    chunk by chunk as the wrapped app yields them, so streamed responses
+    are never buffered beyond the first min_size bytes. Compressed output
+    is flushed to the client every flush_size input bytes, and whenever
+    the app yields an empty chunk. Responses that are too small, not in
+    the content-type allowlist or already encoded are passed through
+    untouched.
+    """
+
+    def __init__(self, app, min_size=500, level=6, mimetypes=COMPRESSIBLE_MIMETYPES, flush_size=16 * 1024):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.mimetypes = mimetypes
+        self.flush_size = flush_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = []
+        sent = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            if sent:
+                # Headers already went out; the server re-raises exc_info
+                return start_response(status, headers, exc_info)
+            captured[:] = [status, headers, exc_info]
+            return self._unsupported_write
+
+        def send_start_response(status, headers, exc_info=None):
+            sent.append(True)
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.app(environ, capture_start_response)
+        close = getattr(app_iter, 'close', None)
+        chunks = iter(app_iter)
+        first = []
+        if not captured:
+            # Generator apps call start_response on their first iteration
+            try:
+                first.append(next(chunks))
+            except StopIteration:
+                pass
+            except BaseException:
+                if close is not None:
+                    close()
+                raise
+        chunks = itertools.chain(first, chunks)
+        status, headers, exc_info = captured
+
+        if not self.should_compress(status, headers):
+            send_start_response(status, headers, exc_info)
+            return ClosingIterator(chunks, close)
+
+        return ClosingIterator(
+            self.compress_iter(chunks, status, headers, exc_info, send_start_response, encoding), close
+        )
+
+    @staticmethod
+    def _unsupported_write(data):
+        raise RuntimeError('CompressionMiddleware does not support the WSGI write() callable')
+
+    @staticmethod
+    def negotiate(accept_encoding):
+        """Pick the best supported content coding for the request"""
+        accepted = parse_accept_header(accept_encoding)
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def should_compress(self, status, headers):
+        if status[:3] in ('204', '206', '304') or int(status[:3]) < 200:
+            return False
+
+        values = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in values or 'content-range' in values:
+            return False
+        if 'no-transform' in values.get('cache-control', ''):
+            return False
+
+        mimetype = values.get('content-type', '').split(';')[0].strip().lower()
+        if mimetype not in self.mimetypes:
+            return False
+
+        content_length = values.get('content-length')
+        if content_length is not None and int(content_length) < self.min_size:
+            return False
+
+        return True
+
+    def compressed_headers(self, headers, encoding):
+        result = []
+        vary = None
+        for name, value in headers:
+            lname = name.lower()
+            if lname == 'content-length':
+                continue
+            if lname == 'vary':
+                vary = value
+                continue
+            if lname == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value
+            result.append((name, value))
+
+        if vary and 'accept-encoding' not in vary.lower():
+            vary += ', Accept-Encoding'
+        result.append(('Vary', vary or 'Accept-Encoding'))
+        result.append(('Content-Encoding', encoding))
+        return result
+
+    def make_compressor(self, encoding):
+        if encoding == 'br':
+            return BrotliCompressor(self.level)
+        return GzipCompressor(self.level)
+
+    def compress_iter(self, chunks, status, headers, exc_info, start_response, encoding):
+        buffered = []
+        buffered_size = 0
+        compressor = None
+        pending = 0
+
+        for chunk in chunks:
+            if compressor is None:
+                if not chunk:
+                    continue
+                # Hold back the first bytes until the body is known to be
+                # large enough to be worth compressing
+                buffered.append(chunk)
+                buffered_size += len(chunk)
+                if buffered_size < self.min_size:
+                    continue
+                compressor = self.make_compressor(encoding)
+                start_response(status, self.compressed_headers(headers, encoding), exc_info)
+                chunk = b''.join(buffered)
+                buffered = None
+
+            if chunk:
+                data = compressor.compress(chunk)
+                pending += len(chunk)
+            else:
+                data = b''
+            # An empty chunk asks for everything so far to reach the client
+            if pending and (not chunk or pending >= self.flush_size):
+                data += compressor.flush()
+                pending = 0
+            if data:
+                yield data
+
+        if compressor is None:
+            start_response(status, headers, exc_info)
+            if buffered:
+                yield b''.join(buffered)
+        else:
+            yield compressor.finish()
+
+class GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # Sync flush: everything so far can be decoded by the client
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+import assets
+
+_page_version = None
+
+def page_version():
+    """Fingerprint of the templates and collected assets pages are rendered from.
+
+    Computed once per process, so a deploy invalidates every ETag.
+    """
+    global _page_version
+    if _page_version is None or current_app.debug:
+        digest = hashlib.sha256()
+        template_folder = os.path.join(current_app.root_path, current_app.template_folder)
+        for root, dirs, files in os.walk(template_folder):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f'{root}/{name}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+        digest.update(json.dumps(assets._manifest, sort_keys=True).encode())
+        _page_version = digest.hexdigest()
+    return _page_version
+
+def page_etag(*parts):
+    """ETag of a page rendered from parts for the current viewer"""
+    viewer = current_user.get_id() if current_user.is_authenticated else None
+    raw = repr((page_version(), viewer) + parts)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def set_cache_headers(response, etag, last_modified):
+    """Let browsers keep the page but revalidate it on every use.
+
+    Pages of logged-in users may only be stored by their own browser;
+    anonymous ones by shared caches as well.
+    """
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+def not_modified(etag, last_modified):
+    """304 response when the client's copy of the page is current, else None.
+
+    Checked before any rendering. Pages with pending flash messages are
+    always rendered, as the messages are not part of the ETag.
+    """
+    if '_flashes' in session:
+        return None
+    if request.if_none_match:
+        current = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        current = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        current = False
+    if not current:
+        return None
+    return set_cache_headers(current_app.response_class(status=304), etag, last_modified)
@@ -0,0 +1,250 @@
+from datetime import date, timedelta
+
+import click
+
+from app import db
+from dispatch import PENDING_STATUSES, CLOSED_STATUSES, delivery_date_for, trip_days, apply_assignments
+from geo import lane_of
+from models import Order, Driver, DriverUnavailability
+
+# Standard semi-trailer assumed for drivers without own capacity limits
+DEFAULT_VEHICLE_WEIGHT = 20000  # kg
+DEFAULT_VEHICLE_VOLUME = 82  # m³
+# Days an order may wait to be consolidated with others on its lane
+DEFAULT_WINDOW_DAYS = 3
+# Loads filled less than this are held back while their orders can still wait
+DEFAULT_MIN_FILL = 0.6
+
+class Load:
+    """Orders travelling together on one lane in one vehicle"""
+    __slots__ = ('lane', 'deadline', 'orders', 'weight', 'volume', 'driver', 'capacity', 'pickup_date')
+
+    def __init__(self, lane, deadline):
+        self.lane = lane
+        self.deadline = deadline
+        self.orders = []
+        self.weight = 0.0
+        self.volume = 0.0
+        self.driver = None
+        # (max weight, max volume) of the vehicle of the assigned driver
+        self.capacity = None
+        self.pickup_date = None
+
+    @property
+    def driver_id(self):
+        return self.driver.id if self.driver else None
+
+    def add(self, order, weight, volume):
+        self.orders.append(order)
+        self.weight += weight
+        self.volume += volume
+
+    def fill(self, max_weight=None, max_volume=None):
+        """Share of the given capacity in use, by default of the assigned vehicle"""
+        if max_weight is None:
+            max_weight, max_volume = self.capacity
+        return max(self.weight / max_weight, self.volume / max_volume)
+
+def candidate_orders():
+    """Pending inter-city orders without a schedule, as lightweight rows.
+
+    Only orders without a stored lane still hold their address texts.
+    """
+    return db.session.query(
+        Order.id, Order.tracking_number, Order.origin_city, Order.destination_city,
+        Order.pickup_address_text.label('pickup_address'),
+        Order.delivery_address_text.label('delivery_address'),
+        Order.cargo_weight, Order.cargo_volume, Order.created_at
+    ).filter(
+        Order.order_type == 'kazakhstan',
+        Order.status.in_(PENDING_STATUSES),
+        Order.scheduled_pickup_date.is_(None)
+    ).order_by(Order.id).all()
+
+def pack(lane, deadline, orders, max_weight, max_volume):
+    """First-fit decreasing bin packing on the larger of weight and volume share.
+
+    Returns (loads, oversize) where oversize orders do not fit any vehicle.
+    """
+    def share(order):
+        return max((order.cargo_weight or 0) / max_weight, (order.cargo_volume or 0) / max_volume)
+
+    loads = []
+    oversize = []
+    for order in sorted(orders, key=share, reverse=True):
+        weight = order.cargo_weight or 0
+        volume = order.cargo_volume or 0
+        if weight > max_weight or volume > max_volume:
+            oversize.append(order)
+            continue
+        for load in loads:
+            if load.weight + weight <= max_weight and load.volume + volume <= max_volume:
+                load.add(order, weight, volume)
+                break
+        else:
+            load = Load(lane, deadline)
+            load.add(order, weight, volume)
+            loads.append(load)
+    return loads, oversize
+
+def propose_loads(today=None, window_days=DEFAULT_WINDOW_DAYS, min_fill=DEFAULT_MIN_FILL):
+    """Group pending inter-city orders into vehicle loads with a driver each.
+
+    Orders are grouped by (origin city, destination city) lane. Each order
+    may wait window_days after creation; orders whose deadlines fall into
+    the same window are packed together. A load leaves on the earliest day
+    a driver with enough capacity is free for the whole trip, unless it
+    fills less than min_fill of the smallest vehicle it fits into and its
+    earliest deadline is still ahead, in which case its orders are held for
+    a later run. Nothing is written to the database.
+
+    Returns a dict with the proposed `loads` and the tracking numbers of
+    `held` orders, `unassigned` ones (no free driver or too big) and
+    `unrouted` ones (city not recognised or both in the same city).
+    """
+    today = today or date.today()
+    window = timedelta(days=window_days)
+
+    drivers = Driver.query.filter(Driver.active == True).order_by(Driver.id).all()
+    capacities = sorted(
+        (
+            (driver.max_weight or DEFAULT_VEHICLE_WEIGHT, driver.max_volume or DEFAULT_VEHICLE_VOLUME, driver.id, driver)
+            for driver in drivers
+        ),
+        key=lambda c: c[:3]
+    )
+    max_weight = max((c[0] for c in capacities), default=DEFAULT_VEHICLE_WEIGHT)
+    max_volume = max((c[1] for c in capacities), default=DEFAULT_VEHICLE_VOLUME)
+
+    def smallest_vehicle(load):
+        """Capacity of the smallest vehicle of the fleet the load fits into"""
+        return next((
+            (weight, volume) for weight, volume, _, _ in capacities
+            if load.weight <= weight and load.volume <= volume
+        ), (max_weight, max_volume))
+
+    lanes = {}
+    unrouted = []
+    for order in candidate_orders():
+        if order.pickup_address is None:
+            lane = (order.origin_city, order.destination_city) if order.origin_city and order.destination_city else None
+        else:
+            lane = lane_of(order.pickup_address, order.delivery_address)
+        if lane is None or lane[0] == lane[1]:
+            unrouted.append(order.tracking_number)
+            continue
+        created = order.created_at.date() if order.created_at else today
+        lanes.setdefault(lane, []).append((max(created + window, today), order))
+
+    loads = []
+    held = []
+    unassigned = []
+    for lane, items in lanes.items():
+        items.sort(key=lambda item: item[0])
+        start = 0
+        while start < len(items):
+            deadline = items[start][0]
+            end = start
+            while end < len(items) and items[end][0] < deadline + window:
+                end += 1
+            lane_loads, oversize = pack(lane, deadline, [o for _, o in items[start:end]], max_weight, max_volume)
+            unassigned += [o.tracking_number for o in oversize]
+            for load in lane_loads:
+                if load.fill(*smallest_vehicle(load)) < min_fill and deadline > today:
+                    held += [o.tracking_number for o in load.orders]
+                else:
+                    loads.append(load)
+            start = end
+
+    # Busy days inside the planning range: days off and every day of the
+    # trips already planned, from pickup through delivery
+    last_day = today + 2 * window
+    transit = delivery_date_for('kazakhstan', today) - today
+    busy = set(
+        db.session.query(DriverUnavailability.driver_id, DriverUnavailability.date).filter(
+            DriverUnavailability.date >= today,
+            DriverUnavailability.date <= last_day + transit
+        ).all()
+    )
+    planned = db.session.query(
+        Order.driver_id, Order.order_type, Order.scheduled_pickup_date, Order.scheduled_delivery_date
+    ).filter(
+        Order.driver_id.isnot(None),
+        Order.scheduled_pickup_date >= today - transit,
+        Order.scheduled_pickup_date <= last_day + transit,
+        Order.status.notin_(CLOSED_STATUSES)
+    ).distinct()
+    for driver_id, order_type, pickup_date, delivery_date in planned:
+        delivery_date = delivery_date or delivery_date_for(order_type, pickup_date)
+        busy.update((driver_id, day) for day in trip_days(pickup_date, delivery_date))
+
+    # Most urgent and fullest loads pick drivers first; each takes the
+    # smallest vehicle it fits into whose driver is free for the whole trip,
+    # on the earliest possible day
+    proposed = []
+    loads.sort(key=lambda load: (load.deadline, -load.fill(*smallest_vehicle(load))))
+    for load in loads:
+        for offset in range((load.deadline - today).days + window_days + 1):
+            day = today + timedelta(days=offset)
+            trip = trip_days(day, delivery_date_for('kazakhstan', day))
+            choice = next((
+                (weight, volume, driver) for weight, volume, driver_id, driver in capacities
+                if load.weight <= weight and load.volume <= volume
+                and not any((driver_id, trip_day) in busy for trip_day in trip)
+            ), None)
+            if choice is not None:
+                weight, volume, driver = choice
+                busy.update((driver.id, trip_day) for trip_day in trip)
+                load.driver = driver
+                load.capacity = (weight, volume)
+                load.pickup_date = day
+                proposed.append(load)
+                break
+        else:
+            unassigned += [o.tracking_number for o in load.orders]
+
+    return {
+        'loads': proposed,
+        'held': held,
+        'unassigned': unassigned,
+        'unrouted': unrouted,
+    }
+
+def load_assignments(loads):
+    """Per-order proposals of the loads, in the format of apply_assignments()"""
+    return [
+        {
+            'order_id': order.id,
+            'driver_id': load.driver_id,
+            'pickup_date': load.pickup_date,
+            'delivery_date': delivery_date_for('kazakhstan', load.pickup_date),
+        }
+        for load in loads
+        for order in load.orders
+    ]
+
+def init_consolidation(app):
+    """Register the load consolidation CLI command"""
+
+    @app.cli.command('consolidate-loads')
+    @click.option('--window', 'window_days', default=DEFAULT_WINDOW_DAYS, show_default=True,
+                  help='Days an order may wait for consolidation.')
+    @click.option('--min-fill', default=DEFAULT_MIN_FILL, show_default=True,
+                  help='Hold loads filled less than this while their orders can wait.')
+    @click.option('--apply', 'apply_loads', is_flag=True, help='Schedule the proposed loads.')
+    def consolidate_loads_command(window_days, min_fill, apply_loads):
+        """Group pending inter-city orders into shared vehicle loads."""
+        result = propose_loads(window_days=window_days, min_fill=min_fill)
+        for load in result['loads']:
+            click.echo(
+                f"{load.pickup_date} {load.lane[0]} → {load.lane[1]}: {load.driver.full_name}, "
+                f"{len(load.orders)} orders, {load.weight:.0f} kg, {load.volume:.1f} m³, "
+                f"{load.fill():.0%} full"
+            )
+        click.echo(
+            f"{len(result['loads'])} loads, {len(result['held'])} held, "
+            f"{len(result['unassigned'])} unassigned, {len(result['unrouted'])} unrouted"
+        )
+        if apply_loads:
+            applied, skipped = apply_assignments(load_assignments(result['loads']))
+            click.echo(f"Scheduled {applied} orders, skipped {skipped}")
@@ -0,0 +1,213 @@
+from datetime import date, datetime, timedelta
+
+from app import db
+from models import Order, Driver, DriverUnavailability
+
+# Planning horizon for automatic assignment, in days starting today
+DEFAULT_HORIZON_DAYS = 7
+# Orders per driver per day when the driver has no own limit
+DEFAULT_MAX_ORDERS_PER_DAY = 6
+# Days between pickup and delivery for each order type
+TRANSIT_DAYS = {
+    'astana': 0,
+    'kazakhstan': 2,
+}
+
+PENDING_STATUSES = ['new', 'confirmed']
+CLOSED_STATUSES = ['delivered', 'cancelled']
+
+class DriverDay:
+    """Load already planned for one driver on one day"""
+    __slots__ = ('orders', 'weight', 'volume')
+
+    def __init__(self):
+        self.orders = 0
+        self.weight = 0.0
+        self.volume = 0.0
+
+def pending_orders_query():
+    """Orders that still need a driver and pickup date"""
+    return Order.query.filter(
+        Order.status.in_(PENDING_STATUSES),
+        Order.scheduled_pickup_date.is_(None)
+    )
+
+def delivery_date_for(order_type, pickup_date):
+    return pickup_date + timedelta(days=TRANSIT_DAYS.get(order_type, 0))
+
+def trip_days(pickup_date, delivery_date):
+    """Days a shipment keeps its driver busy, from pickup to delivery"""
+    return [pickup_date + timedelta(days=i) for i in range((delivery_date - pickup_date).days + 1)]
+
+def propose_assignments(start_date=None, horizon_days=DEFAULT_HORIZON_DAYS):
+    """Propose a driver and dates for every pending order.
+
+    Orders are placed oldest first (heaviest first within a day) on the
+    earliest day that has capacity, choosing the least loaded available
+    driver whose remaining weight, volume and order limits fit the cargo.
+    Inter-city orders need the driver free on every later day of the trip
+    and keep the driver away until delivery. Nothing is written to the
+    database.
+
+    Returns (proposals, unassigned) where proposals is a list of dicts and
+    unassigned is a list of orders that did not fit into the horizon.
+    """
+    start_date = start_date or date.today()
+    days = [start_date + timedelta(days=i) for i in range(horizon_days)]
+    end_date = days[-1]
+
+    orders = pending_orders_query().all()
+    orders.sort(key=lambda o: (o.created_at.date() if o.created_at else start_date, -(o.cargo_weight or 0)))
+
+    drivers = Driver.query.filter(Driver.active == True).order_by(Driver.id).all()
+    if not drivers:
+        return [], orders
+
+    longest_trip = max(TRANSIT_DAYS.values())
+    unavailable = set(
+        db.session.query(DriverUnavailability.driver_id, DriverUnavailability.date).filter(
+            DriverUnavailability.date >= start_date,
+            DriverUnavailability.date <= end_date + timedelta(days=longest_trip)
+        ).all()
+    )
+
+    # Load from shipments that are already planned inside the horizon;
+    # drivers on an inter-city trip are away until its delivery day
+    load = {}
+    away = set()
+    totals = {driver.id: 0 for driver in drivers}
+    planned = db.session.query(
+        Order.driver_id, Order.order_type, Order.scheduled_pickup_date, Order.scheduled_delivery_date,
+        Order.cargo_weight, Order.cargo_volume
+    ).filter(
+        Order.driver_id.isnot(None),
+        Order.scheduled_pickup_date >= start_date - timedelta(days=longest_trip),
+        Order.scheduled_pickup_date <= end_date,
+        Order.status.notin_(CLOSED_STATUSES)
+    )
+    for driver_id, order_type, pickup_date, delivery_date, weight, volume in planned:
+        delivery_date = delivery_date or delivery_date_for(order_type, pickup_date)
+        away.update((driver_id, day) for day in trip_days(pickup_date, delivery_date)[1:])
+        if pickup_date < start_date:
+            continue
+        day_load = load.setdefault((driver_id, pickup_date), DriverDay())
+        day_load.orders += 1
+        day_load.weight += weight or 0
+        day_load.volume += volume or 0
+        if driver_id in totals:
+            totals[driver_id] += 1
+
+    names = {driver.id: driver.full_name for driver in drivers}
+    limits = [
+        (
+            driver.id,
+            driver.max_orders_per_day or DEFAULT_MAX_ORDERS_PER_DAY,
+            driver.max_weight,
+            driver.max_volume,
+        )
+        for driver in drivers
+    ]
+
+    proposals = []
+    unassigned = []
+
+    for order in orders:
+        weight = order.cargo_weight or 0
+        volume = order.cargo_volume or 0
+        best = None
+
+        for day in days:
+            best_score = None
+            # Later days of the trip, on which the driver must be free
+            later_days = trip_days(day, delivery_date_for(order.order_type, day))[1:]
+            for driver_id, max_orders, max_weight, max_volume in limits:
+                if (driver_id, day) in unavailable or (driver_id, day) in away:
+                    continue
+                if any(
+                    (driver_id, later) in unavailable or (driver_id, later) in away
+                    or (driver_id, later) in load
+                    for later in later_days
+                ):
+                    continue
+                day_load = load.get((driver_id, day))
+                used_orders = day_load.orders if day_load else 0
+                used_weight = day_load.weight if day_load else 0
+                used_volume = day_load.volume if day_load else 0
+
+                if used_orders >= max_orders:
+                    continue
+                if max_weight is not None and used_weight + weight > max_weight:
+                    continue
+                if max_volume is not None and used_volume + volume > max_volume:
+                    continue
+
+                # Balance by daily utilisation first, then by total planned work
+                score = (used_orders / max_orders, totals[driver_id])
+                if best_score is None or score < best_score:
+                    best_score = score
+                    best = (driver_id, day)
+
+            if best:
+                break
+
+        if not best:
+            unassigned.append(order)
+            continue
+
+        driver_id, pickup_date = best
+        delivery_date = delivery_date_for(order.order_type, pickup_date)
+        day_load = load.setdefault(best, DriverDay())
+        day_load.orders += 1
+        day_load.weight += weight
+        day_load.volume += volume
+        away.update((driver_id, day) for day in trip_days(pickup_date, delivery_date)[1:])
+        totals[driver_id] += 1
+
+        proposals.append({
+            'order_id': order.id,
+            'tracking_number': order.tracking_number,
+            'driver_id': driver_id,
+            'driver_name': names[driver_id],
+            'pickup_date': pickup_date,
+            'delivery_date': delivery_date,
+        })
+
+    return proposals, unassigned
+
+def apply_assignments(proposals):
+    """Apply reviewed proposals in a single transaction.
+
+    Orders that were scheduled or closed in the meantime and proposals that
+    reference inactive drivers are skipped. Returns (applied, skipped).
+    """
+    order_ids = [int(p['order_id']) for p in proposals]
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_(order_ids)).all()} if order_ids else {}
+    active_driver_ids = {
+        driver_id for (driver_id,) in db.session.query(Driver.id).filter(Driver.active == True)
+    }
+
+    applied = 0
+    skipped = 0
+    now = datetime.utcnow()
+
+    for proposal in proposals:
+        order = orders.get(int(proposal['order_id']))
+        driver_id = int(proposal['driver_id'])
+        if (
+            order is None
+            or order.status not in PENDING_STATUSES
+            or order.scheduled_pickup_date is not None
+            or driver_id not in active_driver_ids
+        ):
+            skipped += 1
+            continue
+
+        order.driver_id = driver_id
+        order.scheduled_pickup_date = proposal['pickup_date']
+        order.scheduled_delivery_date = proposal['delivery_date']
+        order.status = 'confirmed'
+        order.updated_at = now
+        applied += 1
+
+    db.session.commit()
+    return applied, skipped
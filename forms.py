@@ -1,8 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SelectField, FloatField, PasswordField, DateTimeField, HiddenField
+from wtforms import StringField, TextAreaField, SelectField, FloatField, IntegerField, PasswordField, DateTimeField, DateField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, Optional, NumberRange
 from wtforms.widgets import TextArea
-from models import Driver
+from reference import get_active_drivers
 
 class OrderForm(FlaskForm):
     # Customer information
@@ -60,10 +60,27 @@ class AdminOrderForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(AdminOrderForm, self).__init__(*args, **kwargs)
         # Populate driver choices
-        drivers = Driver.query.filter_by(active=True).all()
+        drivers = get_active_drivers()
         self.driver_id.choices = [(0, 'Не назначен')] + [(d.id, f"{d.full_name} ({d.vehicle_number})") for d in drivers]
 
 class DriverForm(FlaskForm):
     full_name = StringField('Полное имя', validators=[DataRequired(), Length(min=2, max=100)])
     phone = StringField('Номер телефона', validators=[DataRequired(), Length(min=10, max=20)])
     vehicle_number = StringField('Номер автомобиля', validators=[Optional(), Length(max=20)])
+    max_weight = FloatField('Грузоподъемность (кг)', validators=[Optional(), NumberRange(min=0)])
+    max_volume = FloatField('Объем кузова (м³)', validators=[Optional(), NumberRange(min=0)])
+    max_orders_per_day = IntegerField('Заказов в день', validators=[Optional(), NumberRange(min=1)])
+    active = BooleanField('Активен', default=True)
+
+class DriverUnavailabilityForm(FlaskForm):
+    start_date = DateField('С', validators=[DataRequired()])
+    end_date = DateField('По', validators=[Optional()])
+    reason = StringField('Причина', validators=[Optional(), Length(max=100)])
+    
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators):
+            return False
+        if self.end_date.data and self.end_date.data < self.start_date.data:
+            self.end_date.errors.append('Дата окончания раньше даты начала')
+            return False
+        return True
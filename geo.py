@@ -0,0 +1,112 @@
+import re
+
+# Canonical city names with the lowercase stems that identify them in free
+# text addresses; stems cover declensions ("в Караганде", "из Алматы").
+CITIES = {
+    'Астана': ('астан', 'нур-султан', 'нурсултан'),
+    'Алматы': ('алматы', 'алма-ата'),
+    'Шымкент': ('шымкент',),
+    'Караганда': ('караганд',),
+    'Темиртау': ('темиртау',),
+    'Кокшетау': ('кокшетау',),
+    'Павлодар': ('павлодар',),
+    'Экибастуз': ('экибастуз',),
+    'Костанай': ('костанай',),
+    'Петропавловск': ('петропавловск',),
+    'Щучинск': ('щучинск',),
+    'Степногорск': ('степногорск',),
+    'Жезказган': ('жезказган',),
+    'Тараз': ('тараз',),
+    'Кызылорда': ('кызылорд',),
+    'Туркестан': ('туркестан',),
+    'Актобе': ('актобе',),
+    'Атырау': ('атырау',),
+    'Актау': ('актау',),
+    'Уральск': ('уральск',),
+    'Усть-Каменогорск': ('усть-каменогорск', 'оскемен'),
+    'Семей': ('семей', 'семипалатинск'),
+    'Талдыкорган': ('талдыкорган',),
+    'Балхаш': ('балхаш',),
+}
+
+_STEMS = sorted(
+    ((stem, city) for city, stems in CITIES.items() for stem in stems),
+    key=lambda item: -len(item[0])
+)
+# A stem starts a word and may only be followed by a case ending, so
+# street names such as "ул. Семейная" or "Актауская" are no city mention
+_CITY = (
+    r'(?<!\w)(?P<stem>' + '|'.join(re.escape(stem) for stem, _ in _STEMS) + r')'
+    r'(?:а|е|ы|у|ю|я|ой|ом|ем)?(?!\w)'
+)
+_CITY_PATTERN = re.compile(_CITY)
+# "г. Алматы", "город Алматы": the city the address names as such
+_NAMED_CITY_PATTERN = re.compile(r'(?<!\w)(?:г\.?|город)\s*' + _CITY)
+_CITY_BY_STEM = dict(_STEMS)
+
+# Street and building vocabulary of the offline gazetteer: spellings seen
+# in addresses mapped to one abbreviation each
+ADDRESS_WORDS = {
+    'ул': 'ул.', 'улица': 'ул.',
+    'пр': 'пр.', 'пр-т': 'пр.', 'просп': 'пр.', 'проспект': 'пр.',
+    'пер': 'пер.', 'переулок': 'пер.',
+    'б-р': 'б-р', 'бульв': 'б-р', 'бульвар': 'б-р',
+    'ш': 'ш.', 'шоссе': 'ш.',
+    'наб': 'наб.', 'набережная': 'наб.',
+    'пл': 'пл.', 'площадь': 'пл.',
+    'мкр': 'мкр.', 'мкрн': 'мкр.', 'микрорайон': 'мкр.',
+    'ж/м': 'ж/м', 'жм': 'ж/м', 'жилмассив': 'ж/м',
+    'д': 'д.', 'дом': 'д.',
+    'корп': 'корп.', 'корпус': 'корп.',
+    'стр': 'стр.', 'строение': 'стр.',
+    'кв': 'кв.', 'квартира': 'кв.',
+    'оф': 'оф.', 'офис': 'оф.',
+    'скл': 'склад', 'склад': 'склад',
+}
+# Words that only repeat the city or country
+ADDRESS_NOISE = {'г', 'город', 'в', 'рк', 'республика', 'казахстан'}
+
+_TOKEN_PATTERN = re.compile(r'[\w/-]+')
+
+def normalize_address(address):
+    """(city, normalized address) of a free text address.
+
+    Case, punctuation, the city mention and the spelling of street and
+    building words are unified, so different spellings of one address
+    give the same normalized text. The city is None when unknown.
+    """
+    city = city_of(address)
+    tokens = []
+    city_dropped = False
+    for token in _TOKEN_PATTERN.findall((address or '').lower().replace('ё', 'е')):
+        token = token.strip('-/')
+        if not token or token in ADDRESS_NOISE:
+            continue
+        # The first mention of the city is kept as the city key instead
+        if city and not city_dropped:
+            match = _CITY_PATTERN.match(token)
+            if match and _CITY_BY_STEM[match.group('stem')] == city:
+                city_dropped = True
+                continue
+        tokens.append(ADDRESS_WORDS.get(token, token))
+    return city, ' '.join(tokens)
+
+def city_of(address):
+    """Canonical name of the city of an address, or None.
+
+    A city written after "г." or "город" wins, otherwise the first known
+    city mentioned.
+    """
+    if not address:
+        return None
+    text = address.lower()
+    match = _NAMED_CITY_PATTERN.search(text) or _CITY_PATTERN.search(text)
+    return _CITY_BY_STEM[match.group('stem')] if match else None
+
+def lane_of(pickup_address, delivery_address):
+    """(origin city, destination city), or None when either city is unknown"""
+    origin = city_of(pickup_address)
+    destination = city_of(delivery_address)
+    if origin is None or destination is None:
+        return None
+    return origin, destination
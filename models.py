@@ -1,5 +1,8 @@
 from app import db
 from flask_login import UserMixin
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import deferred, undefer_group
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import string
@@ -37,14 +40,126 @@ class Driver(db.Model):
     vehicle_number = db.Column(db.String(20))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Vehicle capacity per working day (None means no limit / app default)
+    max_weight = db.Column(db.Float)  # kg
+    max_volume = db.Column(db.Float)  # m³
+    max_orders_per_day = db.Column(db.Integer)
     
     # Relationship
     orders = db.relationship('Order', backref='assigned_driver', lazy=True)
+    unavailable_days = db.relationship('DriverUnavailability', backref='driver', lazy=True)
     
     def __repr__(self):
         return f'<Driver {self.full_name}>'
 
-class Order(db.Model):
+class DriverUnavailability(db.Model):
+    """Day on which a driver cannot take shipments (day off, vacation, repair)"""
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(100))
+    
+    __table_args__ = (
+        db.UniqueConstraint('driver_id', 'date', name='uq_driver_unavailability_day'),
+    )
+    
+    def __repr__(self):
+        return f'<DriverUnavailability {self.driver_id}: {self.date}>'
+
+ORDER_STATUS_LABELS = {
+    'new': 'Новая заявка',
+    'confirmed': 'Подтверждена',
+    'in_progress': 'В процессе доставки',
+    'delivered': 'Доставлена',
+    'cancelled': 'Отменена'
+}
+
+class Address(db.Model):
+    """Normalized address shared by all orders sent from or to it"""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of city and normalized text
+    city = db.Column(db.String(50), index=True)  # canonical name from geo.CITIES, NULL if unknown
+    normalized = db.Column(db.Text, nullable=False)
+    text = db.Column(db.Text, nullable=False)  # first spelling seen, for display
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Address {self.city}: {self.normalized}>'
+
+def address_text(address_id, legacy_text):
+    """SQL expression of an order address: the dictionary text, else the legacy column"""
+    return func.coalesce(
+        select(Address.text).where(Address.id == address_id).scalar_subquery(),
+        legacy_text
+    )
+
+# Order columns whose text lives in the address dictionary
+ADDRESS_COLUMNS = ('pickup_address', 'delivery_address')
+
+def table_columns(table):
+    """Columns of a table, with the addresses of order tables read from the dictionary"""
+    return [
+        address_text(table.c[f'{column.name}_id'], column).label(column.name)
+        if column.name in ADDRESS_COLUMNS else column
+        for column in table.columns
+    ]
+
+# Unbounded text columns of orders are loaded on first access only; detail
+# views load them together with the row via ORDER_DETAIL_OPTIONS
+ORDER_TEXT_GROUP = 'order_text'
+ORDER_DETAIL_OPTIONS = (undefer_group(ORDER_TEXT_GROUP),)
+
+class OrderDisplayMixin:
+    """Display helpers shared by live and archived orders and list rows"""
+    __slots__ = ()
+    
+    def get_status_display(self):
+        return ORDER_STATUS_LABELS.get(self.status, self.status)
+    
+    @property
+    def is_overdue(self):
+        return self.pickup_overdue_at is not None or self.delivery_overdue_at is not None
+    
+    def get_type_display(self):
+        type_map = {
+            'astana': 'Доставка по Астане',
+            'kazakhstan': 'Межгородская перевозка'
+        }
+        return type_map.get(self.order_type, self.order_type)
+
+class OrderAddressMixin:
+    """Pickup and delivery addresses of live and archived orders.
+
+    Orders reference their addresses in the dictionary (addresses.py).
+    The free text columns, mapped as *_address_text, only hold the
+    addresses of orders that `flask normalize-addresses` has not linked yet.
+    """
+    
+    @hybrid_property
+    def pickup_address(self):
+        if self.pickup_address_record is not None:
+            return self.pickup_address_record.text
+        return self.pickup_address_text
+    
+    @pickup_address.inplace.expression
+    @classmethod
+    def _pickup_address_expression(cls):
+        return address_text(cls.pickup_address_id, cls.pickup_address_text)
+    
+    @hybrid_property
+    def delivery_address(self):
+        if self.delivery_address_record is not None:
+            return self.delivery_address_record.text
+        return self.delivery_address_text
+    
+    @delivery_address.inplace.expression
+    @classmethod
+    def _delivery_address_expression(cls):
+        return address_text(cls.delivery_address_id, cls.delivery_address_text)
+
+class Order(OrderAddressMixin, OrderDisplayMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tracking_number = db.Column(db.String(20), unique=True, nullable=False)
     
@@ -52,19 +167,28 @@ class Order(db.Model):
     customer_name = db.Column(db.String(100), nullable=False)
     customer_phone = db.Column(db.String(20), nullable=False)
     customer_email = db.Column(db.String(120))
-    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     
     # Order details
     order_type = db.Column(db.String(20), nullable=False)  # astana, kazakhstan
-    pickup_address = db.Column(db.Text, nullable=False)
+    pickup_address_text = deferred(db.Column('pickup_address', db.Text), group=ORDER_TEXT_GROUP)
     pickup_contact = db.Column(db.String(100))
     pickup_phone = db.Column(db.String(20))
     
-    delivery_address = db.Column(db.Text, nullable=False)
+    delivery_address_text = deferred(db.Column('delivery_address', db.Text), group=ORDER_TEXT_GROUP)
     delivery_contact = db.Column(db.String(100))
     delivery_phone = db.Column(db.String(20))
     
-    cargo_description = db.Column(db.Text, nullable=False)
+    # Normalized addresses and the lane between their cities (addresses.py);
+    # NULL for orders created before until `flask normalize-addresses` runs
+    pickup_address_id = db.Column(db.Integer, db.ForeignKey('address.id'))
+    delivery_address_id = db.Column(db.Integer, db.ForeignKey('address.id'))
+    pickup_address_record = db.relationship('Address', foreign_keys=[pickup_address_id])
+    delivery_address_record = db.relationship('Address', foreign_keys=[delivery_address_id])
+    origin_city = db.Column(db.String(50))
+    destination_city = db.Column(db.String(50))
+    
+    cargo_description = deferred(db.Column(db.Text, nullable=False), group=ORDER_TEXT_GROUP)
     cargo_weight = db.Column(db.Float)
     cargo_volume = db.Column(db.Float)
     cargo_dimensions = db.Column(db.String(100))
@@ -72,21 +196,36 @@ class Order(db.Model):
     # Order status and management
     status = db.Column(db.String(20), default='new')  # new, confirmed, in_progress, delivered, cancelled
     price = db.Column(db.Float)
+    quoted_price = db.Column(db.Float)  # tariff estimate, see tariffs.py
     driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=True)
     
     # Shipment scheduling
-    scheduled_pickup_date = db.Column(db.Date)
-    scheduled_delivery_date = db.Column(db.Date)
+    scheduled_pickup_date = db.Column(db.Date, index=True)
+    scheduled_delivery_date = db.Column(db.Date, index=True)
     estimated_delivery_time = db.Column(db.String(20))  # morning, afternoon, evening
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     pickup_date = db.Column(db.DateTime)
     delivery_date = db.Column(db.DateTime)
     
+    # SLA flags: when the overdue sweeper (sla.py) found the pickup or
+    # delivery late; NULL while on time
+    pickup_overdue_at = db.Column(db.DateTime)
+    delivery_overdue_at = db.Column(db.DateTime)
+    
     # Internal comments
-    internal_comments = db.Column(db.Text)
+    internal_comments = deferred(db.Column(db.Text), group=ORDER_TEXT_GROUP)
+    
+    __table_args__ = (
+        # Stable (updated_at, id) order for the change feed, see changefeed.py
+        db.Index('ix_order_updated_at_id', 'updated_at', 'id'),
+        # Grouping and filtering by lane, e.g. for load consolidation
+        db.Index('ix_order_lane', 'origin_city', 'destination_city'),
+        # Status/type facet counts of the orders list, read from the index alone
+        db.Index('ix_order_status_type', 'status', 'order_type'),
+    )
     
     def __init__(self, **kwargs):
         super(Order, self).__init__(**kwargs)
@@ -101,29 +240,11 @@ class Order(db.Model):
             random_part = ''.join(random.choices(string.digits, k=3))
             tracking_number = f"AST-{year}-{random_part}"
             
-            # Check if tracking number already exists
-            if not Order.query.filter_by(tracking_number=tracking_number).first():
+            # Check if tracking number already exists, including archived orders
+            if (not Order.query.filter_by(tracking_number=tracking_number).first()
+                    and not ArchivedOrder.query.filter_by(tracking_number=tracking_number).first()):
                 return tracking_number
     
-    def get_status_display(self):
-        status_map = {
-            'new': 'Новая заявка',
-            'confirmed': 'Подтверждена',
-            'in_progress': 'В процессе доставки',
-            'delivered': 'Доставлена',
-            'cancelled': 'Отменена'
-        }
-        return status_map.get(self.status, self.status)
-    
-    def get_type_display(self):
-        type_map = {
-            'astana': 'Доставка по Астане',
-            'kazakhstan': 'Межгородская перевозка'
-        }
-        return type_map.get(self.order_type, self.order_type)
-    
-
-    
     def __repr__(self):
         return f'<Order {self.tracking_number}>'
 
@@ -141,3 +262,91 @@ class OrderStatusHistory(db.Model):
     
     def __repr__(self):
         return f'<OrderStatusHistory {self.order_id}: {self.status}>'
+
+def archive_table(source, name, foreign_keys=None):
+    """Cold-storage copy of a table with the same columns.
+    
+    foreign_keys maps referenced columns of the source table to the ones
+    the archive should reference instead, e.g. {'order.id': 'archived_order.id'}.
+    """
+    foreign_keys = foreign_keys or {}
+    columns = []
+    for column in source.columns:
+        references = [
+            db.ForeignKey(foreign_keys.get(fk.target_fullname, fk.target_fullname))
+            for fk in column.foreign_keys
+        ]
+        columns.append(db.Column(
+            column.name, column.type, *references,
+            primary_key=column.primary_key,
+            autoincrement=False,
+            nullable=column.nullable,
+            unique=column.unique,
+            index=column.index
+        ))
+    return db.Table(name, db.metadata, *columns)
+
+class ArchivedOrder(OrderAddressMixin, OrderDisplayMixin, db.Model):
+    """Closed order moved out of the order table by archive.py"""
+    __table__ = archive_table(Order.__table__, 'archived_order')
+    
+    pickup_address_text = deferred(__table__.c.pickup_address, group=ORDER_TEXT_GROUP)
+    delivery_address_text = deferred(__table__.c.delivery_address, group=ORDER_TEXT_GROUP)
+    cargo_description = deferred(__table__.c.cargo_description, group=ORDER_TEXT_GROUP)
+    internal_comments = deferred(__table__.c.internal_comments, group=ORDER_TEXT_GROUP)
+    
+    # Relationships
+    customer = db.relationship('User')
+    assigned_driver = db.relationship('Driver')
+    pickup_address_record = db.relationship('Address', foreign_keys=[__table__.c.pickup_address_id])
+    delivery_address_record = db.relationship('Address', foreign_keys=[__table__.c.delivery_address_id])
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.tracking_number}>'
+
+class ArchivedOrderStatusHistory(db.Model):
+    __table__ = archive_table(
+        OrderStatusHistory.__table__, 'archived_order_status_history',
+        {'order.id': 'archived_order.id'}
+    )
+    
+    # Relationships
+    order = db.relationship('ArchivedOrder', backref=db.backref('status_history', lazy=True))
+    changed_by = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<ArchivedOrderStatusHistory {self.order_id}: {self.status}>'
+
+class Tariff(db.Model):
+    """Rate bracket: price = base_price + price_per_kg * chargeable weight"""
+    id = db.Column(db.Integer, primary_key=True)
+    order_type = db.Column(db.String(20), nullable=False)  # astana, kazakhstan
+    zone = db.Column(db.String(20), nullable=False)  # city, near, far
+    max_weight = db.Column(db.Float)  # upper bound of the bracket in kg, None for the last bracket
+    base_price = db.Column(db.Float, nullable=False)
+    price_per_kg = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Tariff {self.order_type}/{self.zone} <= {self.max_weight}>'
+
+class DriverDailyStats(db.Model):
+    """Per-driver, per-day order rollup maintained by rollups.py.
+
+    One row per (day, driver_id, order_type); driver_id is None for
+    orders without an assigned driver. day is the order creation date.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    driver_id = db.Column(db.Integer, index=True)
+    order_type = db.Column(db.String(20), nullable=False)
+    
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    total_price = db.Column(db.Float, nullable=False, default=0)
+    on_time = db.Column(db.Integer, nullable=False, default=0)  # delivered by scheduled_delivery_date
+    overdue = db.Column(db.Integer, nullable=False, default=0)  # delivered after scheduled_delivery_date
+    
+    def __repr__(self):
+        return f'<DriverDailyStats {self.day} {self.driver_id} {self.order_type}>'
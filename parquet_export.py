@@ -0,0 +1,245 @@
+import heapq
+import logging
+import os
+import shutil
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, select
+
+from app import db
+from models import Order, ArchivedOrder, OrderStatusHistory, ArchivedOrderStatusHistory, Driver, table_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet export is unavailable without pyarrow
+    pa = pq = None
+
+DEFAULT_BATCH_SIZE = 10000
+
+# dataset name -> (live table, archive table or None, partition column)
+DATASETS = {
+    'orders': (Order.__table__, ArchivedOrder.__table__, 'created_at'),
+    'status_history': (OrderStatusHistory.__table__, ArchivedOrderStatusHistory.__table__, 'created_at'),
+    'drivers': (Driver.__table__, None, None),
+}
+
+def parquet_available():
+    return pa is not None
+
+def require_pyarrow():
+    if pa is None:
+        raise click.ClickException("Parquet export needs the pyarrow package (pip install pyarrow)")
+
+def arrow_type(column_type):
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+def arrow_schema(table, archived=False):
+    """Arrow schema with the native types of the table columns.
+
+    Datasets with an archive get an extra `archived` flag column.
+    """
+    fields = [pa.field(c.name, arrow_type(c.type), nullable=c.nullable or c.primary_key) for c in table.columns]
+    if archived:
+        fields.append(pa.field('archived', pa.bool_()))
+    return pa.schema(fields)
+
+def record_batch(schema, rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+def stream_rows(table, where=None, order_by=None, extra=(), batch_size=DEFAULT_BATCH_SIZE):
+    """Rows of a table as tuples, fetched from a server-side cursor in batches.
+
+    `extra` values are appended to every row. Order addresses are read
+    from the address dictionary.
+    """
+    query = select(*table_columns(table))
+    if where is not None:
+        query = query.where(where)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for row in partition:
+            yield tuple(row) + tuple(extra)
+
+def partition_dirs(dataset_dir, column):
+    """Dates of the Hive-style `<column>_date=YYYY-MM-DD` partitions already written"""
+    prefix = f'{column}_date='
+    if not os.path.isdir(dataset_dir):
+        return set()
+    return {
+        date.fromisoformat(name[len(prefix):])
+        for name in os.listdir(dataset_dir)
+        if name.startswith(prefix) and not name.endswith('.tmp')
+    }
+
+class PartitionWriter:
+    """Writes one partition directory at a time, flushing every batch_size rows.
+
+    Each partition is written to a .tmp directory and renamed when
+    complete, so an interrupted run never leaves a partial partition that
+    an incremental run would skip.
+    """
+
+    def __init__(self, dataset_dir, column, schema, batch_size):
+        self.dataset_dir = dataset_dir
+        self.column = column
+        self.schema = schema
+        self.batch_size = batch_size
+        self.day = None
+        self.writer = None
+        self.buffer = []
+        self.partitions = 0
+        self.rows = 0
+
+    def path(self, day):
+        return os.path.join(self.dataset_dir, f'{self.column}_date={day.isoformat()}')
+
+    def add(self, day, row):
+        if day != self.day:
+            self.close()
+            self.day = day
+            tmp = self.path(day) + '.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            self.writer = pq.ParquetWriter(os.path.join(tmp, 'part-0.parquet'), self.schema, compression='zstd')
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_batch(record_batch(self.schema, self.buffer))
+            self.rows += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        final = self.path(self.day)
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(final + '.tmp', final)
+        self.writer = None
+        self.partitions += 1
+
+def export_partitioned(name, output_dir, full=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Export one dataset partitioned by day of its partition column.
+
+    Incremental runs (full=False) only write days after the newest
+    partition on disk. The current day is never written, as it is still
+    filling up. Returns (partitions, rows) written.
+    """
+    live, archive, column = DATASETS[name]
+    dataset_dir = os.path.join(output_dir, name)
+    if full:
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    existing = partition_dirs(dataset_dir, column)
+    start = datetime.combine(max(existing) + timedelta(days=1), datetime.min.time()) if existing else None
+    end = datetime.combine(date.today(), datetime.min.time())
+
+    schema = arrow_schema(live, archived=True)
+    streams = []
+    for table, archived in ((live, False), (archive, True)):
+        where = table.c[column] < end
+        if start is not None:
+            where = where & (table.c[column] >= start)
+        streams.append(stream_rows(table, where, table.c[column], extra=(archived,), batch_size=batch_size))
+
+    # Both tables are read in partition column order and merged, so only
+    # one batch per table and one partition buffer are held in memory
+    position = list(live.columns.keys()).index(column)
+    writer = PartitionWriter(dataset_dir, column, schema, batch_size)
+    for row in heapq.merge(*streams, key=lambda r: r[position]):
+        writer.add(row[position].date(), row)
+    writer.close()
+    return writer.partitions, writer.rows
+
+def write_rows(writer, schema, rows, batch_size):
+    """Write rows to a ParquetWriter in record batches; returns the row count"""
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            writer.write_batch(record_batch(schema, batch))
+            count += len(batch)
+            batch = []
+    if batch:
+        writer.write_batch(record_batch(schema, batch))
+        count += len(batch)
+    return count
+
+def export_table(name, output_dir, batch_size=DEFAULT_BATCH_SIZE):
+    """Rewrite an unpartitioned dimension table such as drivers"""
+    table = DATASETS[name][0]
+    schema = arrow_schema(table)
+    path = os.path.join(output_dir, name, f'{name}.parquet')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with pq.ParquetWriter(path + '.tmp', schema, compression='zstd') as writer:
+        rows = write_rows(writer, schema, stream_rows(table, order_by=table.c.id, batch_size=batch_size), batch_size)
+    os.replace(path + '.tmp', path)
+    return rows
+
+def export_parquet(output_dir, full=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Export orders, status history and drivers; returns a summary per dataset"""
+    require_pyarrow()
+    summary = {}
+    for name, (_, _, column) in DATASETS.items():
+        if column is None:
+            summary[name] = (1, export_table(name, output_dir, batch_size))
+        else:
+            summary[name] = export_partitioned(name, output_dir, full, batch_size)
+        logging.info(f"Parquet export of {name}: {summary[name][0]} partitions, {summary[name][1]} rows")
+    return summary
+
+def export_orders(where, sink, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream live and archived orders to one Parquet file.
+
+    `where(table)` returns the filter for the live and the archive table.
+    Rows are fetched and written in batches, so only one batch is held in
+    memory. Returns the number of rows written.
+    """
+    require_pyarrow()
+    live, archive, column = DATASETS['orders']
+    schema = arrow_schema(live, archived=True)
+    rows = 0
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for table, archived in ((live, False), (archive, True)):
+            stream = stream_rows(table, where(table), table.c[column], extra=(archived,), batch_size=batch_size)
+            rows += write_rows(writer, schema, stream, batch_size)
+    return rows
+
+def init_parquet_export(app):
+    """Register the Parquet export CLI command"""
+
+    @app.cli.command('export-parquet')
+    @click.option('--output', default=lambda: os.path.join(app.instance_path, 'exports', 'parquet'),
+                  show_default='instance/exports/parquet', help='Target directory.')
+    @click.option('--full', is_flag=True, help='Rewrite all partitions instead of appending new days.')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help='Rows fetched and written per batch.')
+    def export_parquet_command(output, full, batch_size):
+        """Export orders, status history and drivers to partitioned Parquet files."""
+        for name, (partitions, rows) in export_parquet(output, full, batch_size).items():
+            click.echo(f"{name}: {partitions} partitions, {rows} rows")
@@ -0,0 +1,168 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+DEFAULT_INTERVAL_MS = 2
+# A profiled request is sampled for at most this long
+MAX_SECONDS = 60
+MAX_DEPTH = 200
+
+# Categories reported in the Server-Timing header, by top-level package;
+# frames of compiled templates count as jinja, the application's own
+# modules as app
+CATEGORIES = (
+    ('filters', ('utils',)),
+    ('sqlalchemy', ('sqlalchemy', 'flask_sqlalchemy', 'psycopg2', 'sqlite3')),
+    ('jinja', ('jinja2', 'markupsafe', 'template')),
+    ('framework', ('flask', 'werkzeug', 'flask_login', 'flask_wtf', 'wtforms')),
+)
+
+def frame_label(frame, template_folder):
+    code = frame.f_code
+    if code.co_filename.startswith(template_folder):
+        # Compiled Jinja templates run with the template file as filename
+        return f'template:{os.path.relpath(code.co_filename, template_folder)}:{code.co_name}'
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{code.co_name}'
+
+# Top-level modules of this application
+APP_MODULES = frozenset(
+    name[:-3] for name in os.listdir(os.path.dirname(os.path.abspath(__file__))) if name.endswith('.py')
+)
+
+def category_of(stack):
+    """Category of the innermost frame of a known library or of the app.
+
+    Frames of other modules, such as the standard library, count towards
+    their nearest caller, so a view that is busy in its own code is 'app'
+    even though Flask frames surround it.
+    """
+    for label in reversed(stack):
+        package = label.split(':', 1)[0].split('.', 1)[0]
+        for category, packages in CATEGORIES:
+            if package in packages:
+                return category
+        if package in APP_MODULES:
+            return 'app'
+    return 'app'
+
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread.
+
+    The profiled thread runs unmodified (no tracing hooks); every
+    `interval` seconds the sampler reads its current frame and counts the
+    call stack, which costs the request little beyond sharing the GIL.
+    """
+
+    def __init__(self, thread_id, interval, template_folder):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.template_folder = template_folder.rstrip(os.sep) + os.sep
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        deadline = time.perf_counter() + MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(frame_label(frame, self.template_folder))
+                frame = frame.f_back
+            del frame
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Stacks in the collapsed format of flamegraph.pl, inferno and speedscope"""
+        return ''.join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def categories(self):
+        """Estimated milliseconds per category, scaled to the measured time"""
+        counts = Counter()
+        for stack, count in self.stacks.items():
+            counts[category_of(stack)] += count
+        scale = self.elapsed * 1000 / self.samples if self.samples else 0
+        return {category: count * scale for category, count in counts.most_common()}
+
+    def server_timing(self):
+        parts = [f'{category};dur={ms:.1f}' for category, ms in self.categories().items()]
+        parts.append(f'total;dur={self.elapsed * 1000:.1f};desc="{self.samples} samples"')
+        return ', '.join(parts)
+
+def profiling_requested():
+    return 'X-Profile' in request.headers or '_profile' in request.args
+
+def init_profiler(app):
+    """Profile single requests of logists on demand.
+
+    A request with an `X-Profile` header or a `_profile` query parameter
+    from a logist is sampled; the collapsed stacks are written to
+    instance/profiles and the time per category is returned in the
+    Server-Timing header. Other requests only pay for the flag lookup.
+    """
+    output_dir = os.path.join(app.instance_path, 'profiles')
+    interval = app.config.get('PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS) / 1000
+    template_folder = os.path.join(app.root_path, app.template_folder)
+
+    @app.before_request
+    def start_request_profiler():
+        if not profiling_requested():
+            return
+        if not (current_user.is_authenticated and current_user.is_logist()):
+            return
+        g.profiler = SamplingProfiler(threading.get_ident(), interval, template_folder)
+        g.profiler.start()
+
+    @app.after_request
+    def stop_request_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{os.getpid()}.folded"
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, name), 'w') as f:
+                f.write(profiler.collapsed())
+            response.headers['X-Profile-File'] = name
+        except OSError as e:
+            logging.error(f"Failed to write profile {name}: {str(e)}")
+        response.headers['Server-Timing'] = profiler.server_timing()
+        logging.info(f"Profiled {request.path}: {profiler.samples} samples, {name}")
+        return response
+
+    @app.teardown_request
+    def discard_request_profiler(exc):
+        # after_request does not run when the view raised
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,44 @@
+from sqlalchemy import func
+
+from models import OrderDisplayMixin
+from reference import get_drivers
+
+# Longest text prefix shown by any order list
+PREVIEW_LENGTH = 40
+
+# Columns a list page may show; text columns are selected as previews
+ORDER_LIST_FIELDS = (
+    'id', 'tracking_number', 'customer_name', 'customer_phone', 'customer_email',
+    'order_type', 'status', 'price', 'driver_id', 'created_at',
+    'pickup_overdue_at', 'delivery_overdue_at',
+    'pickup_address', 'delivery_address', 'cargo_description',
+)
+TEXT_FIELDS = ('pickup_address', 'delivery_address', 'cargo_description')
+
+class OrderRow(OrderDisplayMixin):
+    """Read-only order of a list page, built from a column projection.
+
+    Unlike ORM instances, rows are not tracked by the session and take a
+    fixed set of slots. Fields that were not selected are None and text
+    fields hold only their first PREVIEW_LENGTH characters.
+    """
+    __slots__ = ORDER_LIST_FIELDS + ('assigned_driver',)
+
+    def __init__(self, values, drivers):
+        for name in ORDER_LIST_FIELDS:
+            setattr(self, name, values.get(name))
+        # DriverInfo of the reference cache, like Order.assigned_driver
+        self.assigned_driver = drivers.get(self.driver_id)
+
+def list_columns(model, fields):
+    """Columns of model for the given list fields, with text previews"""
+    return [
+        func.substr(getattr(model, name), 1, PREVIEW_LENGTH).label(name) if name in TEXT_FIELDS
+        else getattr(model, name)
+        for name in fields
+    ]
+
+def order_rows(query):
+    """OrderRow objects for the rows of a query over list_columns()"""
+    drivers = {driver.id: driver for driver in get_drivers()}
+    return [OrderRow(row._mapping, drivers) for row in query]
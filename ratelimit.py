@@ -0,0 +1,221 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import g, jsonify, make_response, request, session
+
+try:
+    import redis
+except ImportError:  # the shared backend is optional
+    redis = None
+
+# Atomic token bucket in Redis: refills `rate` tokens per second up to
+# `burst`, takes one token and returns the seconds to wait (0 = allowed).
+# Uses the Redis clock, so workers on different hosts agree on time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+class RedisBackend:
+    """Token buckets and rejection counters shared by all workers"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        # Short timeouts: a slow Redis must not become the bottleneck
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.prefix = prefix
+        self._take = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[f'{self.prefix}bucket:{key}'], args=[rate, burst]))
+
+    def count(self, field):
+        self.client.hincrby(f'{self.prefix}rejected', field, 1)
+
+    def counts(self):
+        return {k.decode(): int(v) for k, v in self.client.hgetall(f'{self.prefix}rejected').items()}
+
+# Set by init_ratelimit() when RATE_LIMIT_REDIS_URL is configured
+shared_backend = None
+
+class RateLimiter:
+    """Token bucket per client: `limit` requests per `period` seconds on
+    average, with bursts of up to `burst` requests.
+
+    Buckets live in this process unless a shared backend is configured.
+    In-process, every gunicorn worker keeps its own buckets, so the
+    effective limit is at most `limit` times the number of workers. When
+    the shared backend fails, the in-process buckets take over.
+    """
+
+    def __init__(self, limit, period=60, burst=None):
+        self.rate = limit / period
+        self.burst = burst or limit
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Take one token; returns seconds to wait, or 0 when allowed"""
+        if shared_backend is not None:
+            try:
+                return retry_seconds(shared_backend.take(key, self.rate, self.burst))
+            except redis.RedisError as e:
+                logging.error(f"Shared rate limit backend failed: {str(e)}")
+        return retry_seconds(self._take(key))
+
+    def _take(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            # Forget full buckets once in a while
+            if len(self._buckets) > 10000:
+                self._buckets = {
+                    k: (t, ts) for k, (t, ts) in self._buckets.items()
+                    if t + (now - ts) * self.rate < self.burst
+                }
+        return 0
+
+def retry_seconds(wait):
+    return math.ceil(wait) if wait > 0 else 0
+
+class LoadShedder:
+    """Counts the requests this worker is handling.
+
+    Routes protected with rate_limit(..., shed=True) are turned away while
+    more than `max_in_flight` requests are in progress, so a backlog of
+    cheap public requests cannot occupy every thread. Only threaded workers
+    run several requests at once, and `max_in_flight` must stay below their
+    thread count to ever trigger. 0 disables shedding.
+    """
+
+    def __init__(self, max_in_flight=0):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def overloaded(self):
+        # The current request is counted as well
+        return bool(self.max_in_flight) and self.in_flight > self.max_in_flight
+
+load_shedder = LoadShedder()
+
+rejections = Counter()
+_rejections_lock = threading.Lock()
+
+def count_rejection(endpoint, reason):
+    field = f'{endpoint}:{reason}'
+    with _rejections_lock:
+        rejections[field] += 1
+    if shared_backend is not None:
+        try:
+            shared_backend.count(field)
+        except redis.RedisError:
+            pass
+
+def rejection_counts():
+    """Rejected requests per `endpoint:reason`, across workers when shared"""
+    if shared_backend is not None:
+        try:
+            return shared_backend.counts()
+        except redis.RedisError:
+            pass
+    with _rejections_lock:
+        return dict(rejections)
+
+def client_key():
+    """Logged-in clients are limited per account, anonymous ones per IP.
+
+    The account comes from the signed session rather than current_user,
+    which would load the user from the database before the check.
+    """
+    user_id = session.get('_user_id')
+    if user_id is not None:
+        return f'user:{user_id}'
+    return ip_key()
+
+def ip_key():
+    """Client IP, as resolved by ProxyFix; needs no database lookup"""
+    return f'ip:{request.remote_addr}'
+
+def rejected_response(status, message, retry_after):
+    if request.is_json:
+        response = jsonify({'error': message})
+    else:
+        response = make_response('Сервер перегружен, повторите попытку позже' if status == 503
+                                 else 'Слишком много запросов, повторите попытку позже')
+        response.mimetype = 'text/plain'
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limit(limiter, key=client_key, shed=False):
+    """Answer 429 with Retry-After once the client exceeds the limiter.
+
+    With shed=True the route first answers 503 while the worker is
+    overloaded. Both checks run before the view touches the database.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_view(*args, **kwargs):
+            if shed and load_shedder.overloaded():
+                count_rejection(view.__name__, 'shed')
+                return rejected_response(503, 'Service overloaded', 1)
+            retry_after = limiter.hit((view.__name__, key()))
+            if retry_after:
+                count_rejection(view.__name__, 'rate_limited')
+                return rejected_response(429, 'Too many requests', retry_after)
+            return view(*args, **kwargs)
+        return decorated_view
+    return decorator
+
+def init_ratelimit(app):
+    """Connect the shared backend and count requests in flight"""
+    global shared_backend
+    url = app.config.get('RATE_LIMIT_REDIS_URL')
+    if url:
+        if redis is None:
+            logging.error("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; using in-process limits")
+        else:
+            shared_backend = RedisBackend(url)
+    load_shedder.max_in_flight = app.config.get('LOAD_SHED_MAX_IN_FLIGHT', 0)
+
+    @app.before_request
+    def count_request_in_flight():
+        load_shedder.enter()
+        g.counted_in_flight = True
+
+    @app.teardown_request
+    def release_request_in_flight(exc):
+        if g.pop('counted_in_flight', False):
+            load_shedder.leave()
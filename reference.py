@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from cache import FragmentCache, bump_data_version
+from models import Driver
+
+DriverInfo = namedtuple('DriverInfo', ['id', 'full_name', 'phone', 'vehicle_number', 'active'])
+
+REFERENCE_TIMEOUT = 300
+# Seconds a worker uses its cached drivers before checking whether the
+# rows changed, e.g. after another worker edited them
+VERSION_CHECK_INTERVAL = 30
+
+reference_cache = FragmentCache(timeout=REFERENCE_TIMEOUT)
+
+_driver_version = None
+_checked_at = 0.0
+_version_lock = threading.Lock()
+
+def driver_version():
+    """Row count and newest updated_at of the drivers; changes with every edit"""
+    return tuple(db.session.query(func.count(Driver.id), func.max(Driver.updated_at)).one())
+
+def check_driver_version():
+    """Drop cached drivers when the driver rows changed.
+
+    Writes of this worker invalidate the cache at once; changes made by
+    other workers are noticed with one aggregate query at most every
+    VERSION_CHECK_INTERVAL seconds.
+    """
+    global _driver_version, _checked_at
+    if time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+        return
+    with _version_lock:
+        if time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+            return
+        version = driver_version()
+        if _driver_version is not None and version != _driver_version:
+            reference_cache.bump_version()
+            bump_data_version()
+        _driver_version = version
+        _checked_at = time.monotonic()
+
+def load_drivers():
+    rows = db.session.query(
+        Driver.id, Driver.full_name, Driver.phone, Driver.vehicle_number, Driver.active
+    ).order_by(Driver.id).all()
+    return tuple(DriverInfo(*row) for row in rows)
+
+def get_drivers():
+    """All drivers as immutable DriverInfo tuples, loaded once per version"""
+    check_driver_version()
+    return reference_cache.get_or_set(['drivers'], load_drivers)
+
+def get_active_drivers():
+    check_driver_version()
+    return reference_cache.get_or_set(
+        ['drivers', 'active'], lambda: tuple(d for d in get_drivers() if d.active)
+    )
+
+@event.listens_for(Session, 'after_flush')
+def _track_driver_writes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Driver):
+            session.info['drivers_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    if session.info.pop('drivers_changed', False):
+        reference_cache.bump_version()
+        # Reports and dashboards show driver names as well
+        bump_data_version()
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_on_rollback(session):
+    session.info.pop('drivers_changed', None)
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+
+# Bind key of the replica engine in SQLALCHEMY_BINDS
+REPLICA_BIND_KEY = 'replica'
+# Seconds between two replication lag probes of a worker
+LAG_CHECK_INTERVAL = 5
+# Flask session key holding the time until which the client reads from the primary
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+# PostgreSQL standby lag in seconds; 0 when caught up or not a standby
+POSTGRES_LAG_SQL = text(
+    "SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+)
+
+class RoutingSession(Session):
+    """Session sending the SELECTs of replica-enabled views to the read replica.
+
+    Flushes and every other statement go to the primary. Once a request
+    writes, the rest of it and the client's requests during the next
+    DATABASE_REPLICA_STICKY_SECONDS read from the primary too, so users
+    always see their own changes despite replication lag.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if not self._flushing and getattr(clause, 'is_select', False):
+                engine = self._db.engines.get(REPLICA_BIND_KEY)
+                if engine is not None and should_read_from_replica(engine):
+                    return engine
+            else:
+                mark_write(self._db)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_replica(view):
+    """Let the SELECTs of a read-only view go to the read replica"""
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return decorated_view
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. right before a write"""
+    previous = g.get('use_replica', False)
+    g.use_replica = False
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+def wants_primary():
+    """Per-request override: ?consistency=primary or X-Read-Consistency: primary"""
+    return (
+        request.args.get('consistency') == 'primary'
+        or request.headers.get('X-Read-Consistency') == 'primary'
+    )
+
+def should_read_from_replica(engine):
+    if not has_request_context() or not g.get('use_replica') or g.get('db_wrote'):
+        return False
+    if wants_primary():
+        return False
+    if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+        return False
+    return replica_is_fresh(engine, current_app.config.get('DATABASE_REPLICA_MAX_LAG', 0))
+
+def mark_write(db):
+    """Pin the current request and the client's next reads to the primary"""
+    if not has_request_context() or g.get('db_wrote'):
+        return
+    g.db_wrote = True
+    if REPLICA_BIND_KEY not in db.engines:
+        return
+    sticky_seconds = current_app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 0)
+    if sticky_seconds > 0:
+        session[PRIMARY_UNTIL_KEY] = time.time() + sticky_seconds
+
+def measure_replica_lag(engine):
+    """Replication lag in seconds; 0 where the backend cannot report it"""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as conn:
+        return float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+
+_lag_lock = threading.Lock()
+_lag_checked_at = None
+_replica_fresh = True
+
+def replica_is_fresh(engine, max_lag):
+    """Whether the replica lags less than max_lag seconds (0 disables the check).
+
+    The lag is probed at most every LAG_CHECK_INTERVAL seconds per worker.
+    An unreachable replica counts as stale, so reads fall back to the primary.
+    """
+    global _lag_checked_at, _replica_fresh
+    if not max_lag:
+        return True
+
+    now = time.monotonic()
+    with _lag_lock:
+        if _lag_checked_at is not None and now - _lag_checked_at < LAG_CHECK_INTERVAL:
+            return _replica_fresh
+        _lag_checked_at = now
+
+    try:
+        lag = measure_replica_lag(engine)
+        fresh = lag <= max_lag
+        if not fresh:
+            logging.warning(f"Read replica lags {lag:.1f}s, reading from primary")
+    except Exception as e:
+        logging.error(f"Read replica check failed: {str(e)}")
+        fresh = False
+
+    _replica_fresh = fresh
+    return fresh
+
+def init_replica(app):
+    """Register the replica status CLI command"""
+
+    @app.cli.command('replica-status')
+    def replica_status_command():
+        """Show whether a read replica is configured and how far it lags."""
+        engine = app.extensions['sqlalchemy'].engines.get(REPLICA_BIND_KEY)
+        if engine is None:
+            click.echo("No read replica configured (DATABASE_REPLICA_URL)")
+            return
+        click.echo(f"Replica: {engine.url.render_as_string(hide_password=True)}")
+        click.echo(f"Lag: {measure_replica_lag(engine):.1f}s")
@@ -0,0 +1,191 @@
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+
+import click
+
+from app import app
+from reports import financial_summary, write_financial_csv
+
+DEFAULT_WORKERS = 2
+# Queued or running jobs older than this are considered lost (worker restarted)
+JOB_TIMEOUT = 1800
+# Job files are removed this long after they were last written
+RETENTION_SECONDS = 86400
+
+def job_key(spec, fingerprint):
+    """Job id: identical specs over unchanged data share one job and result"""
+    raw = json.dumps(spec, sort_keys=True) + fingerprint
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def run_job(directory, meta):
+    """Build a report in a pool process and store the result next to the job file"""
+    path = os.path.join(directory, f"{meta['id']}.json")
+    spec = meta['spec']
+    write_json(path, dict(meta, status='running', started_at=time.time()))
+    try:
+        with app.app_context():
+            if spec['output'] == 'csv':
+                result_file = f"{meta['id']}.csv"
+                tmp = os.path.join(directory, result_file + '.tmp')
+                with open(tmp, 'w', newline='', encoding='utf-8') as f:
+                    write_financial_csv(spec, f)
+                os.replace(tmp, os.path.join(directory, result_file))
+                done = dict(meta, status='done', file=result_file)
+            else:
+                done = dict(meta, status='done', result=financial_summary(spec))
+    except Exception as e:
+        logging.error(f"Report job {meta['id']} failed: {str(e)}")
+        write_json(path, dict(meta, status='failed', error=str(e), finished_at=time.time()))
+        return
+    write_json(path, dict(done, finished_at=time.time()))
+
+class ReportQueue:
+    """Report jobs run in a bounded process pool, off the request threads.
+
+    Job state and results are files in one directory shared by all
+    gunicorn workers. The job id is derived from the spec and the data
+    fingerprint, and a job file is claimed with an atomic hard link, so
+    identical concurrent requests of any worker end up waiting for the
+    same job, and a finished result is served until the data changes.
+    """
+
+    def __init__(self, directory=None, workers=DEFAULT_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self._pool = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, job_id):
+        """Job state dict, or None for unknown ids"""
+        try:
+            with open(self.path(f'{job_id}.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (meta['status'] in ('queued', 'running') and job_id not in self._futures
+                and time.time() - meta['submitted_at'] > JOB_TIMEOUT):
+            meta.update(status='failed', error='Задача прервана')
+        elif meta['status'] == 'done' and meta.get('file') and not os.path.exists(self.path(meta['file'])):
+            meta.update(status='failed', error='Результат удалён')
+        return meta
+
+    def result_path(self, meta):
+        return self.path(meta['file']) if meta.get('file') else None
+
+    def submit(self, spec, fingerprint):
+        """Return the job for spec, starting it unless an identical one exists"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.purge_expired()
+
+        job_id = job_key(spec, fingerprint)
+        existing = self.get(job_id)
+        if existing and existing['status'] != 'failed':
+            return existing
+
+        meta = {'id': job_id, 'spec': spec, 'status': 'queued', 'submitted_at': time.time()}
+        path = self.path(f'{job_id}.json')
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        write_json(tmp, meta)
+        try:
+            if existing:
+                os.replace(tmp, path)
+            else:
+                # link() fails when another request claimed the job first
+                os.link(tmp, path)
+                os.remove(tmp)
+        except FileExistsError:
+            os.remove(tmp)
+            return self.get(job_id)
+
+        with self._lock:
+            if self._pool is None:
+                # Spawned processes import the app first, see init_report_jobs()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=importlib.import_module,
+                    initargs=('app',)
+                )
+            future = self._pool.submit(run_job, self.directory, meta)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        return meta
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        error = future.exception()
+        if error is not None:
+            # The pool process died; run_job could not record the failure
+            logging.error(f"Report job {job_id} crashed: {str(error)}")
+            meta = self.get(job_id)
+            if meta:
+                write_json(self.path(f'{job_id}.json'), dict(meta, status='failed', error=str(error)))
+            with self._lock:
+                if self._pool is not None and getattr(self._pool, '_broken', False):
+                    self._pool = None
+
+    def wait(self, job_id, timeout):
+        """Wait up to timeout seconds for a job of this worker; returns its state"""
+        future = self._futures.get(job_id)
+        if future is not None and timeout:
+            wait_futures([future], timeout=timeout)
+        return self.get(job_id)
+
+    def purge_expired(self, max_age=RETENTION_SECONDS, force=False):
+        """Remove job and result files not written for max_age seconds"""
+        now = time.time()
+        if not force and now - self._last_purge < 3600:
+            return 0
+        self._last_purge = now
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.split('.')[0] in self._futures:
+                continue
+            try:
+                if now - os.path.getmtime(self.path(name)) > max_age:
+                    os.remove(self.path(name))
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+report_queue = ReportQueue()
+
+def init_report_jobs(app):
+    """Configure the report queue and register its CLI command.
+
+    Pool processes are spawned rather than forked, as the web worker runs
+    background threads, and import the `app` module before the first job
+    is unpickled, which in turn imports this module completely.
+    """
+    report_queue.directory = app.config.get('REPORT_JOBS_DIR') or os.path.join(app.instance_path, 'reports')
+    report_queue.workers = app.config.get('REPORT_WORKERS', DEFAULT_WORKERS)
+
+    @app.cli.command('purge-reports')
+    @click.option('--max-age', default=RETENTION_SECONDS, show_default=True,
+                  help='Remove report files older than this many seconds.')
+    def purge_reports_command(max_age):
+        """Remove expired report jobs and their results."""
+        if not os.path.isdir(report_queue.directory):
+            click.echo("Removed 0 files")
+            return
+        click.echo(f"Removed {report_queue.purge_expired(max_age, force=True)} files")
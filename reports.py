@@ -0,0 +1,136 @@
+import csv
+import hashlib
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+
+from app import db
+from models import Order, ArchivedOrder, ORDER_STATUS_LABELS
+from reference import get_drivers
+
+# Archived orders keep counting towards the financial reports
+REPORT_SOURCES = (Order, ArchivedOrder)
+
+WEEKDAY_NAMES = (
+    'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'
+)
+
+CSV_HEADER = [
+    'Номер заказа', 'Дата создания', 'Клиент', 'Направление',
+    'Откуда', 'Куда', 'Статус', 'Водитель', 'Стоимость'
+]
+
+def financial_spec(start_date, end_date, order_type=None, output='summary'):
+    """JSON-serialisable description of a financial report; output is 'summary' or 'csv'"""
+    return {
+        'report': 'financial',
+        'output': output,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'order_type': order_type or None,
+    }
+
+def spec_days(spec):
+    return (date.fromisoformat(spec['end_date']) - date.fromisoformat(spec['start_date'])).days + 1
+
+def financial_filters(model, spec):
+    start = datetime.combine(date.fromisoformat(spec['start_date']), time.min)
+    end = datetime.combine(date.fromisoformat(spec['end_date']) + timedelta(days=1), time.min)
+    filters = [model.created_at >= start, model.created_at < end, model.price.isnot(None)]
+    if spec['order_type']:
+        filters.append(model.order_type == spec['order_type'])
+    return filters
+
+def report_rows(spec, *columns):
+    """Rows of live and archived orders in the report range, oldest first"""
+    for model in REPORT_SOURCES:
+        query = db.session.query(*(getattr(model, name) for name in columns)).filter(
+            *financial_filters(model, spec)
+        ).order_by(model.created_at).execution_options(yield_per=5000)
+        yield from query
+
+def report_fingerprint(spec):
+    """Version of the data a report reads.
+
+    Any insert, update, archiving or deletion in the range changes the
+    row count or the newest updated_at; renamed drivers change the names.
+    Both aggregates run over the created_at index, so this is cheap
+    compared to building the report.
+    """
+    parts = []
+    for model in REPORT_SOURCES:
+        parts.append(tuple(db.session.query(func.count(), func.max(model.updated_at)).filter(
+            *financial_filters(model, spec)
+        ).one()))
+    parts.append(tuple((driver.id, driver.full_name) for driver in get_drivers()))
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def financial_summary(spec):
+    """Totals, chart series and top lists of the financial report page"""
+    total_expenses = 0
+    total_orders = 0
+    expenses_by_type = {}
+    monthly_expenses = {}
+    driver_stats = {}
+    weekly_stats = {}
+    driver_names = {driver.id: driver.full_name for driver in get_drivers()}
+
+    for created_at, order_type, price, driver_id in report_rows(spec, 'created_at', 'order_type', 'price', 'driver_id'):
+        price = price or 0
+        total_expenses += price
+        total_orders += 1
+        expenses_by_type[order_type] = expenses_by_type.get(order_type, 0) + price
+
+        month_key = created_at.strftime('%Y-%m')
+        monthly_expenses[month_key] = monthly_expenses.get(month_key, 0) + price
+
+        if driver_id is not None:
+            if driver_id not in driver_stats:
+                driver_stats[driver_id] = {
+                    'name': driver_names.get(driver_id, str(driver_id)),
+                    'order_count': 0,
+                    'revenue': 0  # keeping key name for template compatibility
+                }
+            driver_stats[driver_id]['order_count'] += 1
+            driver_stats[driver_id]['revenue'] += price
+
+        day_name = WEEKDAY_NAMES[created_at.weekday()]
+        if day_name not in weekly_stats:
+            weekly_stats[day_name] = {'day_name': day_name, 'order_count': 0, 'revenue': 0}
+        weekly_stats[day_name]['order_count'] += 1
+        weekly_stats[day_name]['revenue'] += price
+
+    months = sorted(monthly_expenses)
+    return {
+        'total_revenue': total_expenses,
+        'total_orders': total_orders,
+        'avg_order_value': total_expenses / total_orders if total_orders > 0 else 0,
+        'revenue_by_type_labels': ['Астана' if k == 'astana' else 'Казахстан' for k in expenses_by_type],
+        'revenue_by_type_data': list(expenses_by_type.values()),
+        'monthly_labels': [datetime.strptime(k, '%Y-%m').strftime('%b %Y') for k in months],
+        'monthly_revenue_data': [monthly_expenses[k] for k in months],
+        'top_drivers': sorted(driver_stats.values(), key=lambda x: x['revenue'], reverse=True)[:5],
+        'weekly_stats': list(weekly_stats.values()),
+    }
+
+def write_financial_csv(spec, stream):
+    """Write the orders of a financial report as CSV rows to a text stream"""
+    driver_names = {driver.id: driver.full_name for driver in get_drivers()}
+    writer = csv.writer(stream)
+    writer.writerow(CSV_HEADER)
+    rows = report_rows(
+        spec, 'tracking_number', 'created_at', 'customer_name', 'order_type',
+        'pickup_address', 'delivery_address', 'status', 'driver_id', 'price'
+    )
+    for row in rows:
+        writer.writerow([
+            row.tracking_number,
+            row.created_at.strftime('%d.%m.%Y %H:%M'),
+            row.customer_name,
+            'Астана' if row.order_type == 'astana' else 'Казахстан',
+            row.pickup_address,
+            row.delivery_address,
+            ORDER_STATUS_LABELS.get(row.status, row.status),
+            driver_names.get(row.driver_id, 'Не назначен'),
+            f'{row.price:.0f}' if row.price else '0'
+        ])
@@ -0,0 +1,215 @@
+import logging
+from datetime import datetime, time, timedelta
+
+import click
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Order, ArchivedOrder, Driver, DriverDailyStats
+
+# Order attributes that change an order's contribution to the rollup
+ROLLUP_ATTRIBUTES = (
+    'created_at', 'driver_id', 'order_type', 'status', 'price',
+    'delivery_date', 'scheduled_delivery_date',
+)
+
+# Archived orders keep counting towards the rollup
+ROLLUP_SOURCES = (Order, ArchivedOrder)
+
+def rollup_columns(model):
+    return (
+        model.created_at, model.driver_id, model.order_type, model.status,
+        model.price, model.delivery_date, model.scheduled_delivery_date,
+    )
+
+def rollup_key(created_at, driver_id, order_type):
+    return (created_at.date(), driver_id, order_type)
+
+def empty_counters():
+    return {
+        'orders': 0,
+        'delivered': 0,
+        'cancelled': 0,
+        'total_price': 0.0,
+        'on_time': 0,
+        'overdue': 0,
+    }
+
+def add_order(counters, status, price, delivery_date, scheduled_delivery_date):
+    counters['orders'] += 1
+    counters['total_price'] += price or 0
+    if status == 'cancelled':
+        counters['cancelled'] += 1
+    elif status == 'delivered':
+        counters['delivered'] += 1
+        if delivery_date and scheduled_delivery_date:
+            if delivery_date.date() <= scheduled_delivery_date:
+                counters['on_time'] += 1
+            else:
+                counters['overdue'] += 1
+
+def recompute_keys(connection, keys):
+    """Rebuild the rollup rows for the given (day, driver_id, order_type) keys"""
+    for day, driver_id, order_type in keys:
+        day_start = datetime.combine(day, time.min)
+        rows = []
+        for model in ROLLUP_SOURCES:
+            driver_filter = model.driver_id.is_(None) if driver_id is None else model.driver_id == driver_id
+            rows += connection.execute(
+                select(*rollup_columns(model)).where(
+                    model.created_at >= day_start,
+                    model.created_at < day_start + timedelta(days=1),
+                    model.order_type == order_type,
+                    driver_filter
+                )
+            ).all()
+
+        stats_driver_filter = (
+            DriverDailyStats.driver_id.is_(None) if driver_id is None
+            else DriverDailyStats.driver_id == driver_id
+        )
+        connection.execute(delete(DriverDailyStats).where(
+            DriverDailyStats.day == day,
+            DriverDailyStats.order_type == order_type,
+            stats_driver_filter
+        ))
+
+        if not rows:
+            continue
+        counters = empty_counters()
+        for row in rows:
+            add_order(counters, row.status, row.price, row.delivery_date, row.scheduled_delivery_date)
+        connection.execute(insert(DriverDailyStats).values(
+            day=day, driver_id=driver_id, order_type=order_type, **counters
+        ))
+
+def rebuild_driver_stats(batch_size=5000):
+    """Recompute the whole rollup table from live and archived orders"""
+    totals = {}
+    for model in ROLLUP_SOURCES:
+        query = db.session.query(*rollup_columns(model)).filter(
+            model.created_at.isnot(None)
+        ).execution_options(yield_per=batch_size)
+
+        for row in query:
+            key = rollup_key(row.created_at, row.driver_id, row.order_type)
+            counters = totals.get(key)
+            if counters is None:
+                counters = totals[key] = empty_counters()
+            add_order(counters, row.status, row.price, row.delivery_date, row.scheduled_delivery_date)
+
+    db.session.execute(delete(DriverDailyStats))
+    rows = [
+        dict(day=day, driver_id=driver_id, order_type=order_type, **counters)
+        for (day, driver_id, order_type), counters in totals.items()
+    ]
+    if rows:
+        db.session.execute(insert(DriverDailyStats), rows)
+    db.session.commit()
+    return len(rows)
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_driver_stats(session, flush_context):
+    keys = set()
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Order):
+            continue
+
+        state = inspect(obj)
+        changed = obj in session.new or obj in session.deleted or any(
+            state.attrs[name].history.has_changes() for name in ROLLUP_ATTRIBUTES
+        )
+        if not changed:
+            continue
+
+        if obj.created_at is not None:
+            keys.add(rollup_key(obj.created_at, obj.driver_id, obj.order_type))
+
+        # The key the order was counted under before this flush
+        def previous(name):
+            history = state.attrs[name].history
+            return history.deleted[0] if history.deleted else getattr(obj, name)
+
+        old_created_at = previous('created_at')
+        if old_created_at is not None:
+            keys.add(rollup_key(old_created_at, previous('driver_id'), previous('order_type')))
+
+    if keys:
+        recompute_keys(session.connection(), keys)
+
+def get_report_stats(start_date, end_date):
+    """Summary and per-driver statistics for orders created in [start_date, end_date].
+
+    Sums at most one rollup row per driver, day and order type instead of
+    scanning the orders table.
+    """
+    rows = db.session.query(
+        DriverDailyStats.driver_id,
+        Driver.full_name,
+        DriverDailyStats.order_type,
+        func.sum(DriverDailyStats.orders).label('orders'),
+        func.sum(DriverDailyStats.delivered).label('delivered'),
+        func.sum(DriverDailyStats.cancelled).label('cancelled'),
+        func.sum(DriverDailyStats.total_price).label('total_price'),
+        func.sum(DriverDailyStats.on_time).label('on_time'),
+        func.sum(DriverDailyStats.overdue).label('overdue')
+    ).outerjoin(Driver, Driver.id == DriverDailyStats.driver_id).filter(
+        DriverDailyStats.day >= start_date,
+        DriverDailyStats.day <= end_date
+    ).group_by(
+        DriverDailyStats.driver_id, Driver.full_name, DriverDailyStats.order_type
+    ).all()
+
+    totals = empty_counters()
+    orders_by_type = {}
+    drivers = {}
+
+    for row in rows:
+        for name in totals:
+            totals[name] += getattr(row, name) or 0
+        orders_by_type[row.order_type] = orders_by_type.get(row.order_type, 0) + row.orders
+
+        if row.driver_id is None:
+            continue
+        driver = drivers.setdefault(row.driver_id, {
+            'full_name': row.full_name,
+            'order_count': 0,
+            'total_cost': 0.0,
+            'delivered': 0,
+            'cancelled': 0,
+            'on_time': 0,
+            'overdue': 0,
+        })
+        driver['order_count'] += row.orders
+        driver['total_cost'] += row.total_price or 0
+        driver['delivered'] += row.delivered
+        driver['cancelled'] += row.cancelled
+        driver['on_time'] += row.on_time
+        driver['overdue'] += row.overdue
+
+    total_orders = totals['orders']
+    return {
+        'total_orders': total_orders,
+        'total_revenue': totals['total_price'],
+        'avg_cost': totals['total_price'] / total_orders if total_orders > 0 else 0,
+        'delivered_orders': totals['delivered'],
+        'cancelled_orders': totals['cancelled'],
+        'on_time_orders': totals['on_time'],
+        'overdue_orders': totals['overdue'],
+        'astana_orders': orders_by_type.get('astana', 0),
+        'kz_orders': orders_by_type.get('kazakhstan', 0),
+        'driver_stats': sorted(drivers.values(), key=lambda d: d['order_count'], reverse=True),
+        'period': f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
+    }
+
+def init_rollups(app):
+    """Register the rollup rebuild CLI command"""
+
+    @app.cli.command('rebuild-driver-stats')
+    def rebuild_driver_stats_command():
+        """Recompute the per-driver daily rollup from all orders."""
+        count = rebuild_driver_stats()
+        logging.info(f"Driver stats rebuilt: {count} rows")
+        click.echo(f"Rebuilt {count} driver stats rows")
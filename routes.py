@@ -1,15 +1,34 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, make_response
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
-from models import User, Order, Driver, OrderStatusHistory
-from forms import OrderForm, TrackingForm, RegistrationForm, LoginForm, AdminOrderForm, DriverForm
+from models import User, Order, Driver, DriverUnavailability, OrderStatusHistory, ArchivedOrder, ORDER_DETAIL_OPTIONS
+from projections import ORDER_LIST_FIELDS, list_columns, order_rows
+from cache import fragment_cache
+from dispatch import propose_assignments, apply_assignments
+from consolidation import propose_loads, load_assignments
+from addresses import set_order_addresses
+from tariffs import get_tariff_table, get_zone, quote_order
+from rollups import get_report_stats
+from reports import financial_filters, financial_spec, financial_summary, report_fingerprint, spec_days, write_financial_csv
+from report_jobs import report_queue
+from archive import find_order_by_tracking_number, find_tracking_rows
+from replica import read_replica
+from sqlite_profile import read_only_transactions
+from reference import get_active_drivers, get_drivers
+from conditional import not_modified, page_etag, set_cache_headers
+from changefeed import DEFAULT_LIMIT, MAX_LIMIT, fetch_changes
+from parquet_export import export_orders, parquet_available
+from sla import overdue_filter
+from ratelimit import RateLimiter, ip_key, load_shedder, rate_limit, rejection_counts
+from forms import OrderForm, TrackingForm, RegistrationForm, LoginForm, AdminOrderForm, DriverForm, DriverUnavailabilityForm
 from werkzeug.security import generate_password_hash
 from telegram_bot import send_telegram_notification
-from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, func, extract
+import hmac
 import logging
-import csv
 from io import StringIO
+from tempfile import SpooledTemporaryFile
 
 @app.route('/')
 def index():
@@ -28,7 +47,13 @@ def create_order(order_type):
     
     return render_template('order_form.html', form=form, order_type=order_type, order_title=order_title)
 
+# Public endpoints are limited per IP and shed first when the worker is busy
+submit_order_limiter = RateLimiter(app.config['SUBMIT_ORDER_RATE_LIMIT'], period=60,
+                                   burst=app.config['SUBMIT_ORDER_RATE_BURST'])
+track_result_limiter = RateLimiter(app.config['TRACK_RESULT_RATE_LIMIT'], period=60)
+
 @app.route('/submit_order', methods=['POST'])
+@rate_limit(submit_order_limiter, key=ip_key, shed=True)
 def submit_order():
     form = OrderForm()
     
@@ -40,10 +65,8 @@ def submit_order():
                 customer_phone=form.customer_phone.data,
                 customer_email=None,  # Email field removed from form
                 order_type=form.order_type.data,
-                pickup_address=form.pickup_address.data,
                 pickup_contact=form.pickup_contact.data,
                 pickup_phone=form.pickup_phone.data,
-                delivery_address=form.delivery_address.data,
                 delivery_contact=form.delivery_contact.data,
                 delivery_phone=form.delivery_phone.data,
                 cargo_description=form.cargo_description.data,
@@ -56,6 +79,12 @@ def submit_order():
             if current_user.is_authenticated:
                 order.customer_id = current_user.id
             
+            # Addresses are stored once in the dictionary, with the lane for grouping
+            set_order_addresses(order, form.pickup_address.data, form.delivery_address.data)
+            
+            # Preliminary price from the tariff table
+            order.quoted_price = quote_order(order)
+            
             db.session.add(order)
             db.session.commit()
             
@@ -79,31 +108,68 @@ def submit_order():
     
     return render_template('order_form.html', form=form, order_type=order_type, order_title=order_title)
 
+def order_status_page(tracking_number, success_page=False):
+    """Order status page, or a 304 when the client's copy is still current.
+    
+    The ETag comes from the order's updated_at and assigned driver, read in
+    one lookup on the tracking number index; the order is only loaded and
+    rendered when the page changed. Returns None for unknown orders.
+    """
+    row = find_tracking_rows([tracking_number], ('tracking_number', 'updated_at', 'driver_id')).get(tracking_number)
+    if row is None:
+        return None
+    
+    driver = next((d for d in get_drivers() if d.id == row.driver_id), None)
+    etag = page_etag('order_status', tracking_number, row.updated_at, driver, success_page)
+    response = not_modified(etag, row.updated_at)
+    if response is None:
+        order = find_order_by_tracking_number(tracking_number)
+        response = make_response(render_template('order_status.html', order=order, success_page=success_page))
+        set_cache_headers(response, etag, row.updated_at)
+    return response
+
 @app.route('/order_success/<tracking_number>')
 def order_success(tracking_number):
-    order = Order.query.filter_by(tracking_number=tracking_number).first()
-    if not order:
+    response = order_status_page(tracking_number, success_page=True)
+    if response is None:
         flash('Заказ не найден', 'error')
         return redirect(url_for('index'))
     
-    return render_template('order_status.html', order=order, success_page=True)
+    return response
+
+@app.route('/quote')
+def quote():
+    """Instant tariff estimate for the order form"""
+    order_type = request.args.get('order_type', '')
+    weight = request.args.get('weight', type=float)
+    volume = request.args.get('volume', type=float)
+    zone = get_zone(order_type, request.args.get('pickup_address'), request.args.get('delivery_address'))
+    
+    price = get_tariff_table().quote(order_type, zone, weight, volume)
+    
+    return jsonify({'price': price, 'zone': zone})
 
 @app.route('/track')
 def track_order():
     form = TrackingForm()
     return render_template('track_order.html', form=form)
 
-@app.route('/track_result', methods=['POST'])
+@app.route('/track_result', methods=['GET', 'POST'])
+@read_only_transactions
+@rate_limit(track_result_limiter, key=ip_key, shed=True)
 def track_result():
     # Handle tracking request directly from form data
-    tracking_number = request.form.get('tracking_number', '').strip()
+    tracking_number = request.values.get('tracking_number', '').strip()
     
     if tracking_number:
         tracking_number = tracking_number.upper()
-        order = Order.query.filter_by(tracking_number=tracking_number).first()
+        if request.method == 'POST':
+            # Refreshing the result page then sends a conditional GET
+            return redirect(url_for('track_result', tracking_number=tracking_number), code=303)
         
-        if order:
-            return render_template('order_status.html', order=order)
+        response = order_status_page(tracking_number)
+        if response is not None:
+            return response
         else:
             flash('Заказ с указанным номером не найден', 'error')
     else:
@@ -112,6 +178,78 @@ def track_result():
     # Return to homepage if validation fails
     return redirect(url_for('index'))
 
+# Batch tracking API for corporate clients
+TRACKING_API_FIELDS = (
+    'tracking_number', 'status', 'scheduled_pickup_date', 'scheduled_delivery_date',
+    'delivery_date', 'updated_at',
+)
+tracking_api_limiter = RateLimiter(app.config['TRACKING_API_RATE_LIMIT'], period=60)
+
+@app.route('/api/track', methods=['POST'])
+@read_only_transactions
+@rate_limit(tracking_api_limiter, shed=True)
+def api_track():
+    """Statuses of many orders at once.
+
+    Expects {"tracking_numbers": [...]} and answers with a field list and
+    one positional row per found order to keep the payload small.
+    """
+    data = request.get_json(silent=True) or {}
+    numbers = data.get('tracking_numbers') if isinstance(data, dict) else data
+    if not isinstance(numbers, list) or not all(isinstance(n, str) for n in numbers):
+        return jsonify({'error': 'tracking_numbers must be a list of strings'}), 400
+    
+    # Normalize like /track_result and drop duplicates, keeping the order
+    numbers = list(dict.fromkeys(n.strip().upper() for n in numbers if n.strip()))
+    max_numbers = app.config['TRACKING_API_MAX_NUMBERS']
+    if len(numbers) > max_numbers:
+        return jsonify({'error': f'At most {max_numbers} tracking numbers per request'}), 400
+    
+    rows = find_tracking_rows(numbers, TRACKING_API_FIELDS)
+    
+    def serialize(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+    
+    return jsonify({
+        'fields': TRACKING_API_FIELDS,
+        'orders': [[serialize(value) for value in rows[n]] for n in numbers if n in rows],
+        'not_found': [n for n in numbers if n not in rows]
+    })
+
+@app.route('/admin/limits')
+@login_required
+def admin_limits():
+    """Rejected public requests and the load of the worker answering"""
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify({
+        'rejected': rejection_counts(),
+        'in_flight': load_shedder.in_flight,
+        'max_in_flight': load_shedder.max_in_flight
+    })
+
+@app.route('/api/changes')
+def api_changes():
+    """Change feed of orders for incremental sync (ERP).
+
+    Authenticated with the CHANGE_FEED_TOKEN bearer token or a logist
+    session. Pass the returned next_cursor back to get the next page.
+    """
+    token = app.config.get('CHANGE_FEED_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not token_ok and not (current_user.is_authenticated and current_user.is_logist()):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    try:
+        orders, next_cursor, has_more = fetch_changes(request.args.get('cursor'), limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({'orders': orders, 'next_cursor': next_cursor, 'has_more': has_more})
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -181,38 +319,71 @@ def logout():
     flash('Вы успешно вышли из системы', 'info')
     return redirect(url_for('index'))
 
+PROFILE_FIELDS = ('tracking_number', 'cargo_description', 'order_type', 'status', 'created_at', 'price')
+
 @app.route('/profile')
 @login_required
 def profile():
-    orders = Order.query.filter_by(customer_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('profile.html', orders=orders)
+    # Order count and newest change per table, over the customer_id index
+    versions = tuple(
+        tuple(db.session.query(func.count(model.id), func.max(model.updated_at)).filter(
+            model.customer_id == current_user.id
+        ).one())
+        for model in (Order, ArchivedOrder)
+    )
+    last_modified = max((updated_at for _, updated_at in versions if updated_at), default=None)
+    # Days-ago labels change daily, account details without a timestamp
+    etag = page_etag(
+        'profile', versions, datetime.now().date(),
+        current_user.full_name, current_user.email, current_user.phone, current_user.role
+    )
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    
+    orders = []
+    for model in (Order, ArchivedOrder):
+        orders += order_rows(db.session.query(*list_columns(model, PROFILE_FIELDS)).filter(
+            model.customer_id == current_user.id
+        ))
+    orders.sort(key=lambda o: o.created_at or datetime.min, reverse=True)
+    response = make_response(render_template('profile.html', orders=orders))
+    return set_cache_headers(response, etag, last_modified)
 
 # Admin routes
+RECENT_ORDER_FIELDS = (
+    'id', 'tracking_number', 'customer_name', 'customer_phone', 'order_type', 'status',
+    'created_at', 'pickup_overdue_at', 'delivery_overdue_at',
+)
+
 @app.route('/admin')
 @login_required
+@read_replica
 def admin_dashboard():
     if not current_user.is_logist():
         flash('У вас нет прав доступа к административной панели', 'error')
         return redirect(url_for('index'))
     
-    # Get statistics
-    total_orders = Order.query.count()
-    new_orders = Order.query.filter_by(status='new').count()
-    in_progress_orders = Order.query.filter_by(status='in_progress').count()
-    delivered_orders = Order.query.filter_by(status='delivered').count()
-    
-    # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    stats = fragment_cache.get_or_set(['dashboard', 'stats'], get_dashboard_stats)
     
-    stats = {
-        'total_orders': total_orders,
-        'new_orders': new_orders,
-        'in_progress_orders': in_progress_orders,
-        'delivered_orders': delivered_orders
-    }
+    # Recent orders are only loaded when the cached fragment has expired
+    recent_orders = lambda: order_rows(
+        db.session.query(*list_columns(Order, RECENT_ORDER_FIELDS)).order_by(Order.created_at.desc()).limit(10)
+    )
     
     return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders)
 
+def get_dashboard_stats():
+    """Order counters shown on the dashboard and in the sidebar badge"""
+    return {
+        'total_orders': Order.query.count() + ArchivedOrder.query.count(),
+        'new_orders': Order.query.filter_by(status='new').count(),
+        'in_progress_orders': Order.query.filter_by(status='in_progress').count(),
+        'delivered_orders': (Order.query.filter_by(status='delivered').count()
+                             + ArchivedOrder.query.filter_by(status='delivered').count()),
+        'overdue_orders': Order.query.filter(overdue_filter()).count()
+    }
+
 @app.route('/admin/orders')
 @login_required
 def admin_orders():
@@ -224,20 +395,55 @@ def admin_orders():
     status_filter = request.args.get('status', '')
     order_type_filter = request.args.get('type', '')
     
-    # Build query
-    query = Order.query
+    # Build query over list columns only; text columns come as previews
+    query = db.session.query(*list_columns(Order, ORDER_LIST_FIELDS))
     
     if status_filter:
-        query = query.filter_by(status=status_filter)
+        query = query.filter(Order.status == status_filter)
     
     if order_type_filter:
-        query = query.filter_by(order_type=order_type_filter)
+        query = query.filter(Order.order_type == order_type_filter)
     
-    orders = query.order_by(Order.created_at.desc()).all()
+    orders = order_rows(query.order_by(Order.created_at.desc()))
+    facets = get_order_facets(status_filter, order_type_filter)
     
-    return render_template('admin/orders.html', orders=orders, 
+    return render_template('admin/orders.html', orders=orders, facets=facets,
                          status_filter=status_filter, order_type_filter=order_type_filter)
 
+@app.route('/admin/orders/facets')
+@login_required
+def admin_order_facets():
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(get_order_facets(request.args.get('status', ''), request.args.get('type', '')))
+
+def get_order_facets(status_filter, order_type_filter):
+    """Order counts per status and per type under the other active filter.
+    
+    Both facets come from one GROUP BY status, order_type query, answered
+    from the (status, order_type) index. It runs live in the same
+    transaction as the list, so counts always match the rows shown.
+    """
+    cells = db.session.query(
+        Order.status, Order.order_type, func.count(Order.id)
+    ).group_by(Order.status, Order.order_type).all()
+    
+    status_counts = {}
+    type_counts = {}
+    for status, order_type, count in cells:
+        if not order_type_filter or order_type == order_type_filter:
+            status_counts[status] = status_counts.get(status, 0) + count
+        if not status_filter or status == status_filter:
+            type_counts[order_type] = type_counts.get(order_type, 0) + count
+    
+    return {
+        'status': status_counts,
+        'type': type_counts,
+        'total_status': sum(status_counts.values()),
+        'total_type': sum(type_counts.values())
+    }
+
 @app.route('/admin/order/<int:order_id>')
 @login_required
 def admin_order_detail(order_id):
@@ -245,8 +451,8 @@ def admin_order_detail(order_id):
         flash('У вас нет прав доступа к административной панели', 'error')
         return redirect(url_for('index'))
     
-    order = Order.query.get_or_404(order_id)
-    drivers = Driver.query.filter_by(active=True).all()
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
+    drivers = get_active_drivers()
     
     return render_template('admin/order_detail.html', order=order, drivers=drivers)
 
@@ -308,61 +514,153 @@ def admin_complete_order(order_id):
         
     return redirect(url_for('admin_order_detail', order_id=order_id))
 
+# Longest day-off range recorded at once
+MAX_UNAVAILABILITY_DAYS = 366
+
+@app.route('/admin/drivers', methods=['GET', 'POST'])
+@login_required
+def admin_drivers():
+    if not current_user.is_logist():
+        flash('У вас нет прав доступа к административной панели', 'error')
+        return redirect(url_for('index'))
+    
+    form = DriverForm()
+    if form.validate_on_submit():
+        driver = Driver()
+        form.populate_obj(driver)
+        db.session.add(driver)
+        db.session.commit()
+        flash('Водитель добавлен', 'success')
+        return redirect(url_for('admin_drivers'))
+    
+    drivers = Driver.query.order_by(Driver.active.desc(), Driver.full_name).all()
+    
+    # Upcoming days off per driver
+    unavailable = {}
+    upcoming = DriverUnavailability.query.filter(
+        DriverUnavailability.date >= date.today()
+    ).order_by(DriverUnavailability.date)
+    for day in upcoming:
+        unavailable.setdefault(day.driver_id, []).append(day)
+    
+    return render_template('admin/drivers.html', form=form, drivers=drivers, unavailable=unavailable)
+
+@app.route('/admin/driver/<int:driver_id>', methods=['GET', 'POST'])
+@login_required
+def admin_driver_detail(driver_id):
+    if not current_user.is_logist():
+        flash('У вас нет прав доступа к административной панели', 'error')
+        return redirect(url_for('index'))
+    
+    driver = Driver.query.get_or_404(driver_id)
+    form = DriverForm(obj=driver)
+    if form.validate_on_submit():
+        form.populate_obj(driver)
+        db.session.commit()
+        flash('Данные водителя обновлены', 'success')
+        return redirect(url_for('admin_driver_detail', driver_id=driver.id))
+    
+    days = DriverUnavailability.query.filter(
+        DriverUnavailability.driver_id == driver.id,
+        DriverUnavailability.date >= date.today()
+    ).order_by(DriverUnavailability.date).all()
+    
+    return render_template('admin/driver_detail.html', driver=driver, form=form,
+                           unavailability_form=DriverUnavailabilityForm(), days=days)
+
+@app.route('/admin/driver/<int:driver_id>/unavailability', methods=['POST'])
+@login_required
+def admin_add_driver_unavailability(driver_id):
+    if not current_user.is_logist():
+        flash('У вас нет прав доступа к административной панели', 'error')
+        return redirect(url_for('index'))
+    
+    driver = Driver.query.get_or_404(driver_id)
+    form = DriverUnavailabilityForm()
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            flash(errors[0], 'error')
+        return redirect(url_for('admin_driver_detail', driver_id=driver.id))
+    
+    start_date = form.start_date.data
+    end_date = form.end_date.data or start_date
+    if (end_date - start_date).days >= MAX_UNAVAILABILITY_DAYS:
+        flash(f'Можно отметить не больше {MAX_UNAVAILABILITY_DAYS} дней за раз', 'error')
+        return redirect(url_for('admin_driver_detail', driver_id=driver.id))
+    
+    # Days already recorded keep their reason
+    recorded = {
+        day for (day,) in db.session.query(DriverUnavailability.date).filter(
+            DriverUnavailability.driver_id == driver.id,
+            DriverUnavailability.date >= start_date,
+            DriverUnavailability.date <= end_date
+        )
+    }
+    added = 0
+    day = start_date
+    while day <= end_date:
+        if day not in recorded:
+            db.session.add(DriverUnavailability(driver_id=driver.id, date=day, reason=form.reason.data or None))
+            added += 1
+        day += timedelta(days=1)
+    db.session.commit()
+    
+    flash(f'Отмечено нерабочих дней: {added}', 'success')
+    return redirect(url_for('admin_driver_detail', driver_id=driver.id))
+
+@app.route('/admin/driver/<int:driver_id>/unavailability/<int:day_id>/delete', methods=['POST'])
+@login_required
+def admin_delete_driver_unavailability(driver_id, day_id):
+    if not current_user.is_logist():
+        flash('У вас нет прав доступа к административной панели', 'error')
+        return redirect(url_for('index'))
+    
+    day = DriverUnavailability.query.filter_by(id=day_id, driver_id=driver_id).first_or_404()
+    db.session.delete(day)
+    db.session.commit()
+    
+    flash('Нерабочий день удален', 'success')
+    return redirect(url_for('admin_driver_detail', driver_id=driver_id))
+
 @app.route('/admin/reports')
 @login_required
+@read_replica
 def admin_reports():
     if not current_user.is_logist():
         flash('У вас нет прав доступа к административной панели', 'error')
         return redirect(url_for('index'))
     
     # Get date range (default: last 30 days)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
-    
-    # Basic statistics
-    total_orders = Order.query.filter(Order.created_at >= start_date).count()
-    total_revenue = db.session.query(func.sum(Order.price)).filter(
-        Order.created_at >= start_date, Order.price.isnot(None)
-    ).scalar() or 0
-    
-    avg_cost = total_revenue / total_orders if total_orders > 0 else 0
-    
-    # Orders by type
-    astana_orders = Order.query.filter(
-        Order.created_at >= start_date, Order.order_type == 'astana'
-    ).count()
-    kz_orders = Order.query.filter(
-        Order.created_at >= start_date, Order.order_type == 'kazakhstan'
-    ).count()
-    
-    # Driver statistics
-    driver_stats = db.session.query(
-        Driver.full_name,
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.price).label('total_cost')
-    ).join(Order, Driver.id == Order.driver_id).filter(
-        Order.created_at >= start_date
-    ).group_by(Driver.id, Driver.full_name).all()
-    
-    stats = {
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'avg_cost': avg_cost,
-        'astana_orders': astana_orders,
-        'kz_orders': kz_orders,
-        'driver_stats': driver_stats,
-        'period': f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
-    }
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=30)
     
-    return render_template('admin/reports.html', stats=stats)
+    stats = fragment_cache.get_or_set(
+        ['reports', 'stats', start_date, end_date],
+        lambda: get_report_stats(start_date, end_date)
+    )
+    
+    return render_template('admin/reports.html', stats=stats, start_date=start_date, end_date=end_date)
 
 @app.route('/admin/analytics')
 @login_required
+@read_replica
 def admin_analytics():
     if not current_user.is_logist():
         flash('У вас нет прав доступа к административной панели', 'error')
         return redirect(url_for('index'))
     
+    monthly_data, status_data = fragment_cache.get_or_set(['analytics', 'data'], get_analytics_data)
+    
+    return render_template('admin/analytics.html', 
+                         monthly_data=monthly_data, 
+                         status_data=status_data)
+
+def get_analytics_data():
+    """Monthly order/revenue series and status distribution for the analytics page"""
     # Get monthly order data for the last 12 months
     monthly_data = []
     for i in range(11, -1, -1):
@@ -374,16 +672,19 @@ def admin_analytics():
             next_month = month_start.replace(month=month_start.month+1) if month_start.month < 12 else month_start.replace(year=month_start.year+1, month=1)
             month_end = next_month - timedelta(days=1)
         
-        order_count = Order.query.filter(
-            Order.created_at >= month_start,
-            Order.created_at <= month_end
-        ).count()
-        
-        revenue = db.session.query(func.sum(Order.price)).filter(
-            Order.created_at >= month_start,
-            Order.created_at <= month_end,
-            Order.price.isnot(None)
-        ).scalar() or 0
+        order_count = 0
+        revenue = 0
+        for model in (Order, ArchivedOrder):
+            order_count += model.query.filter(
+                model.created_at >= month_start,
+                model.created_at <= month_end
+            ).count()
+            
+            revenue += db.session.query(func.sum(model.price)).filter(
+                model.created_at >= month_start,
+                model.created_at <= month_end,
+                model.price.isnot(None)
+            ).scalar() or 0
         
         monthly_data.append({
             'month': month_start.strftime('%Y-%m'),
@@ -396,7 +697,7 @@ def admin_analytics():
     status_data = []
     statuses = ['new', 'confirmed', 'in_progress', 'delivered', 'cancelled']
     for status in statuses:
-        count = Order.query.filter_by(status=status).count()
+        count = Order.query.filter_by(status=status).count() + ArchivedOrder.query.filter_by(status=status).count()
         status_data.append({
             'status': status,
             'count': count,
@@ -408,12 +709,14 @@ def admin_analytics():
             }.get(status, status)
         })
     
-    return render_template('admin/analytics.html', 
-                         monthly_data=monthly_data, 
-                         status_data=status_data)
+    return monthly_data, status_data
+
+# Parquet exports are built in memory up to this size, then on disk
+PARQUET_SPOOL_SIZE = 16 * 1024 * 1024
 
 @app.route('/admin/financial_reports')
 @login_required
+@read_replica
 def admin_financial_reports():
     if not current_user.is_logist():
         flash('У вас нет прав доступа к финансовым отчётам', 'error')
@@ -424,6 +727,19 @@ def admin_financial_reports():
     end_date = request.args.get('end_date')
     order_type = request.args.get('order_type')
     export_format = request.args.get('export')
+    job_id = request.args.get('job', '')
+    
+    # The page polling a background job comes back with its id; the job is
+    # shown as is, since resolving the spec again would fingerprint newer
+    # data and start yet another job
+    report_job = report_queue.get(job_id) if job_id.isalnum() and not export_format else None
+    if report_job and report_job['spec']['output'] == 'summary':
+        spec = report_job['spec']
+        summary = {}
+        if report_job['status'] == 'done':
+            summary = report_job['result']
+            report_job = None
+        return render_financial_reports(spec, report_job, summary)
     
     # Set default date range (last 30 days)
     if not start_date or not end_date:
@@ -433,135 +749,91 @@ def admin_financial_reports():
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     
-    # Build query
-    query = Order.query.filter(
-        Order.created_at >= start_date,
-        Order.created_at <= end_date + timedelta(days=1),
-        Order.price.isnot(None)
-    )
-    
-    if order_type:
-        query = query.filter_by(order_type=order_type)
-    
-    orders = query.all()
-    
-    # Calculate summary statistics (expenses for the company)
-    total_expenses = sum(order.price for order in orders if order.price)
-    total_orders = len(orders)
-    avg_order_value = total_expenses / total_orders if total_orders > 0 else 0
-    active_drivers = Driver.query.filter_by(active=True).count()
-    
-    # Expenses by type (company logistics costs)
-    expenses_by_type = {}
-    for order in orders:
-        order_type_key = order.order_type
-        if order_type_key not in expenses_by_type:
-            expenses_by_type[order_type_key] = 0
-        expenses_by_type[order_type_key] += order.price or 0
-    
-    revenue_by_type_labels = ['Астана' if k == 'astana' else 'Казахстан' for k in expenses_by_type.keys()]
-    revenue_by_type_data = list(expenses_by_type.values())
-    
-    # Monthly expenses data
-    monthly_expenses = {}
-    for order in orders:
-        month_key = order.created_at.strftime('%Y-%m')
-        if month_key not in monthly_expenses:
-            monthly_expenses[month_key] = 0
-        monthly_expenses[month_key] += order.price or 0
-    
-    monthly_labels = [datetime.strptime(k, '%Y-%m').strftime('%b %Y') for k in sorted(monthly_expenses.keys())]
-    monthly_revenue_data = [monthly_expenses[k] for k in sorted(monthly_expenses.keys())]
+    spec = financial_spec(start_date, end_date, order_type, 'csv' if export_format == 'excel' else 'summary')
     
-    # Top drivers by service costs (company expenses)
-    driver_stats = {}
-    for order in orders:
-        if order.assigned_driver:
-            driver_id = order.assigned_driver.id
-            if driver_id not in driver_stats:
-                driver_stats[driver_id] = {
-                    'name': order.assigned_driver.full_name,
-                    'order_count': 0,
-                    'revenue': 0  # keeping key name for template compatibility
-                }
-            driver_stats[driver_id]['order_count'] += 1
-            driver_stats[driver_id]['revenue'] += order.price or 0
-    
-    top_drivers = sorted(driver_stats.values(), key=lambda x: x['revenue'], reverse=True)[:5]
-    
-    # Weekly expenses statistics
-    weekly_stats = {}
-    for order in orders:
-        day_name = order.created_at.strftime('%A')
-        day_name_ru = {
-            'Monday': 'Понедельник',
-            'Tuesday': 'Вторник', 
-            'Wednesday': 'Среда',
-            'Thursday': 'Четверг',
-            'Friday': 'Пятница',
-            'Saturday': 'Суббота',
-            'Sunday': 'Воскресенье'
-        }.get(day_name, day_name)
-        
-        if day_name_ru not in weekly_stats:
-            weekly_stats[day_name_ru] = {'day_name': day_name_ru, 'order_count': 0, 'revenue': 0}  # keeping key name for template compatibility
-        weekly_stats[day_name_ru]['order_count'] += 1
-        weekly_stats[day_name_ru]['revenue'] += order.price or 0
-    
-    weekly_stats = list(weekly_stats.values())
-    
-    # Export to CSV if requested
-    if export_format == 'excel':
-        return generate_csv_report(orders, start_date, end_date)
+    if export_format == 'parquet':
+        if not parquet_available():
+            flash('Экспорт в Parquet недоступен: не установлен пакет pyarrow', 'error')
+        else:
+            # Rows are streamed in batches into a file that only stays in
+            # memory while it is small
+            output = SpooledTemporaryFile(max_size=PARQUET_SPOOL_SIZE)
+            export_orders(lambda table: and_(*financial_filters(table.c, spec)), output)
+            output.seek(0)
+            return send_file(output, mimetype='application/vnd.apache.parquet', as_attachment=True,
+                             download_name=f'financial_report_{start_date}_{end_date}.parquet')
+    
+    report_job = None
+    if spec_days(spec) <= app.config['REPORT_INLINE_DAYS']:
+        # Short ranges are cheap enough to build within the request
+        if export_format == 'excel':
+            return generate_csv_report(spec)
+        summary = financial_summary(spec)
+    else:
+        report_job = report_queue.submit(spec, report_fingerprint(spec))
+        report_job = report_queue.wait(report_job['id'], app.config['REPORT_WAIT_SECONDS'])
+        if report_job['status'] == 'done':
+            if export_format == 'excel':
+                return send_report_file(report_job)
+            summary = report_job['result']
+            report_job = None
+        else:
+            summary = {}
     
+    return render_financial_reports(spec, report_job, summary)
+
+def render_financial_reports(spec, report_job, summary):
     return render_template('admin/financial_reports.html',
-                         start_date=start_date,
-                         end_date=end_date,
-                         order_type=order_type,
-                         total_revenue=total_expenses,
-                         total_orders=total_orders,
-                         avg_order_value=avg_order_value,
-                         active_drivers=active_drivers,
-                         revenue_by_type_labels=revenue_by_type_labels,
-                         revenue_by_type_data=revenue_by_type_data,
-                         monthly_labels=monthly_labels,
-                         monthly_revenue_data=monthly_revenue_data,
-                         top_drivers=top_drivers,
-                         weekly_stats=weekly_stats)
-
-def generate_csv_report(orders, start_date, end_date):
+                         start_date=date.fromisoformat(spec['start_date']),
+                         end_date=date.fromisoformat(spec['end_date']),
+                         order_type=spec['order_type'],
+                         active_drivers=len(get_active_drivers()),
+                         report_job=report_job,
+                         **summary)
+
+def generate_csv_report(spec):
     """Generate CSV report for financial data"""
     output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Номер заказа', 'Дата создания', 'Клиент', 'Направление', 
-        'Откуда', 'Куда', 'Статус', 'Водитель', 'Стоимость'
-    ])
-    
-    # Write data
-    for order in orders:
-        writer.writerow([
-            order.tracking_number,
-            order.created_at.strftime('%d.%m.%Y %H:%M'),
-            order.customer_name,
-            'Астана' if order.order_type == 'astana' else 'Казахстан',
-            order.pickup_address,
-            order.delivery_address,
-            order.get_status_display(),
-            order.assigned_driver.full_name if order.assigned_driver else 'Не назначен',
-            f'{order.price:.0f}' if order.price else '0'
-        ])
+    write_financial_csv(spec, output)
     
     # Prepare response
-    output.seek(0)
     response = make_response(output.getvalue())
     response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=financial_report_{start_date}_{end_date}.csv'
+    response.headers['Content-Disposition'] = f"attachment; filename=financial_report_{spec['start_date']}_{spec['end_date']}.csv"
     
     return response
 
+def send_report_file(job):
+    spec = job['spec']
+    return send_file(report_queue.result_path(job), mimetype='text/csv; charset=utf-8', as_attachment=True,
+                     download_name=f"financial_report_{spec['start_date']}_{spec['end_date']}.csv")
+
+@app.route('/admin/reports/jobs/<job_id>')
+@login_required
+def admin_report_job(job_id):
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    job = report_queue.get(job_id) if job_id.isalnum() else None
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response = {'id': job['id'], 'status': job['status'], 'error': job.get('error')}
+    if job['status'] == 'done' and job.get('file'):
+        response['download_url'] = url_for('admin_report_job_download', job_id=job['id'])
+    return jsonify(response)
+
+@app.route('/admin/reports/jobs/<job_id>/download')
+@login_required
+def admin_report_job_download(job_id):
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    job = report_queue.get(job_id) if job_id.isalnum() else None
+    if job is None or job['status'] != 'done' or not job.get('file'):
+        return jsonify({'error': 'Job not found'}), 404
+    return send_report_file(job)
+
 @app.route('/admin/calendar')
 @login_required
 def admin_calendar():
@@ -570,13 +842,13 @@ def admin_calendar():
         return redirect(url_for('index'))
     
     # Get orders without scheduled dates for planning
-    available_orders = Order.query.filter(
+    available_orders = db.session.query(Order.id, Order.tracking_number, Order.customer_name).filter(
         Order.status.in_(['new', 'confirmed']),
         Order.scheduled_pickup_date.is_(None)
     ).all()
     
     # Get active drivers
-    drivers = Driver.query.filter(Driver.active == True).all()
+    drivers = get_active_drivers()
     
     return render_template('admin/calendar.html', 
                          available_orders=available_orders, 
@@ -584,12 +856,17 @@ def admin_calendar():
 
 @app.route('/admin/calendar/events')
 @login_required  
+@read_replica
 def admin_calendar_events():
     if not current_user.is_logist():
         return jsonify({'error': 'Access denied'}), 403
     
     # Get orders with scheduled dates
-    orders = Order.query.filter(
+    orders = db.session.query(
+        Order.id, Order.tracking_number, Order.status,
+        Order.scheduled_pickup_date, Order.scheduled_delivery_date,
+        Order.pickup_overdue_at, Order.delivery_overdue_at
+    ).filter(
         db.or_(
             Order.scheduled_pickup_date.isnot(None),
             Order.scheduled_delivery_date.isnot(None)
@@ -604,7 +881,7 @@ def admin_calendar_events():
             event_type = 'pickup'
             if order.status == 'cancelled':
                 event_type = 'cancelled'
-            elif order.scheduled_pickup_date < datetime.now().date() and order.status != 'delivered':
+            elif order.pickup_overdue_at:
                 event_type = 'overdue'
                 
             events.append({
@@ -625,7 +902,7 @@ def admin_calendar_events():
             event_type = 'delivery'
             if order.status == 'cancelled':
                 event_type = 'cancelled'
-            elif order.scheduled_delivery_date < datetime.now().date() and order.status != 'delivered':
+            elif order.delivery_overdue_at:
                 event_type = 'overdue'
                 
             events.append({
@@ -649,7 +926,7 @@ def admin_calendar_event_details(order_id):
     if not current_user.is_logist():
         return jsonify({'error': 'Access denied'}), 403
     
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
     
     return jsonify({
         'tracking_number': order.tracking_number,
@@ -684,6 +961,7 @@ def admin_schedule_shipment():
         order.scheduled_delivery_date = delivery_date
         order.driver_id = driver_id
         order.status = 'confirmed'
+        order.updated_at = datetime.utcnow()
         
         db.session.commit()
         
@@ -693,6 +971,88 @@ def admin_schedule_shipment():
         db.session.rollback()
         return jsonify({'success': False, 'message': 'Ошибка при планировании отгрузки'})
 
+@app.route('/admin/calendar/auto_assign', methods=['POST'])
+@read_only_transactions
+@login_required
+def admin_calendar_auto_assign():
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Drivers come from the same fresh read as the proposals
+    proposals, unassigned = propose_assignments()
+    
+    return jsonify({
+        'proposals': [{
+            'order_id': p['order_id'],
+            'tracking_number': p['tracking_number'],
+            'driver_id': p['driver_id'],
+            'driver_name': p['driver_name'],
+            'pickup_date': p['pickup_date'].isoformat(),
+            'delivery_date': p['delivery_date'].isoformat()
+        } for p in proposals],
+        'unassigned': [order.tracking_number for order in unassigned]
+    })
+
+@app.route('/admin/calendar/consolidate', methods=['POST'])
+@read_only_transactions
+@login_required
+def admin_calendar_consolidate():
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Drivers come from the same fresh read as the loads
+    result = propose_loads()
+    
+    return jsonify({
+        'loads': [{
+            'lane': f'{load.lane[0]} → {load.lane[1]}',
+            'driver_name': load.driver.full_name,
+            'pickup_date': load.pickup_date.isoformat(),
+            'tracking_numbers': [order.tracking_number for order in load.orders],
+            'weight': round(load.weight),
+            'volume': round(load.volume, 1),
+            'fill': round(load.fill() * 100)
+        } for load in result['loads']],
+        'assignments': [{
+            'order_id': a['order_id'],
+            'driver_id': a['driver_id'],
+            'pickup_date': a['pickup_date'].isoformat(),
+            'delivery_date': a['delivery_date'].isoformat()
+        } for a in load_assignments(result['loads'])],
+        'held': result['held'],
+        'unassigned': result['unassigned'],
+        'unrouted': result['unrouted']
+    })
+
+@app.route('/admin/calendar/apply_assignments', methods=['POST'])
+@login_required
+def admin_calendar_apply_assignments():
+    if not current_user.is_logist():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    try:
+        payload = request.get_json() or {}
+        proposals = [{
+            'order_id': int(item['order_id']),
+            'driver_id': int(item['driver_id']),
+            'pickup_date': datetime.strptime(item['pickup_date'], '%Y-%m-%d').date(),
+            'delivery_date': datetime.strptime(item['delivery_date'], '%Y-%m-%d').date()
+        } for item in payload.get('assignments', [])]
+        
+        applied, skipped = apply_assignments(proposals)
+        
+        return jsonify({
+            'success': True,
+            'applied': applied,
+            'skipped': skipped,
+            'message': f'Запланировано отгрузок: {applied}'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error applying assignments: {e}")
+        return jsonify({'success': False, 'message': 'Ошибка при применении назначений'})
+
 @app.route('/admin/orders/<int:order_id>/complete', methods=['POST'])
 @login_required
 def admin_complete_order_old(order_id):
@@ -703,6 +1063,7 @@ def admin_complete_order_old(order_id):
         order = Order.query.get_or_404(order_id)
         order.status = 'delivered'
         order.actual_delivery_date = datetime.now().date()
+        order.updated_at = datetime.utcnow()
         
         db.session.commit()
         
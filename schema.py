@@ -0,0 +1,73 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+def rebuild_sqlite_table(conn, table):
+    """Recreate a SQLite table from its model definition, keeping its rows.
+
+    SQLite cannot change column constraints in place, so the rows are
+    copied into a new table that then takes the old one's name. Indexes
+    are dropped with the old table and have to be created again.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    rebuilt = table.to_metadata(table.metadata, name=f'{table.name}_rebuild')
+    try:
+        conn.execute(CreateTable(rebuilt))
+    finally:
+        table.metadata.remove(rebuilt)
+    columns = ', '.join(quote(column.name) for column in table.columns)
+    conn.execute(text(
+        f"INSERT INTO {quote(rebuilt.name)} ({columns}) SELECT {columns} FROM {quote(table.name)}"
+    ))
+    conn.execute(text(f"DROP TABLE {quote(table.name)}"))
+    conn.execute(text(f"ALTER TABLE {quote(rebuilt.name)} RENAME TO {quote(table.name)}"))
+
+def upgrade_schema(db):
+    """Add columns and indexes that db.create_all() cannot add to existing tables.
+
+    create_all() only creates missing tables, so databases created by an
+    older version of the app would miss newly added nullable columns and
+    indexes. New columns must therefore be nullable. Columns that became
+    nullable lose their NOT NULL constraint; on SQLite this rebuilds the
+    table.
+    """
+    engine = db.engine
+    quote = engine.dialect.identifier_preparer.quote
+
+    with engine.begin() as conn:
+        # Inspect through the same connection, which holds the write lock
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            columns = inspector.get_columns(table.name)
+            existing_columns = {c['name'] for c in columns}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                ))
+                logging.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            relaxed = [
+                c['name'] for c in columns
+                if not c['nullable'] and c['name'] in table.c and table.c[c['name']].nullable
+            ]
+            if relaxed and engine.dialect.name == 'sqlite':
+                rebuild_sqlite_table(conn, table)
+                existing_indexes = set()
+                logging.info(f"Rebuilt table {table.name} to allow NULL in {', '.join(relaxed)}")
+            else:
+                for name in relaxed:
+                    conn.execute(text(f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(name)} DROP NOT NULL"))
+                    logging.info(f"Allowed NULL in column {table.name}.{name}")
+
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    logging.info(f"Created index {index.name}")
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from datetime import date, datetime
+
+import click
+from sqlalchemy import and_, event, or_, update
+from sqlalchemy.orm import Session
+
+from app import db
+from cache import bump_data_version
+from models import Order
+from telegram_bot import send_overdue_alert
+
+# A pickup is late while the cargo has not been collected yet,
+# a delivery while the order is still open
+PICKUP_PENDING_STATUSES = ['new', 'confirmed']
+CLOSED_STATUSES = ['delivered', 'cancelled']
+
+DEFAULT_SWEEP_INTERVAL = 600
+
+def overdue_rules(today):
+    """(flag column, scheduled date column, overdue condition) per SLA"""
+    return (
+        (
+            Order.pickup_overdue_at,
+            Order.scheduled_pickup_date,
+            and_(Order.status.in_(PICKUP_PENDING_STATUSES), Order.scheduled_pickup_date < today),
+        ),
+        (
+            Order.delivery_overdue_at,
+            Order.scheduled_delivery_date,
+            and_(Order.status.notin_(CLOSED_STATUSES), Order.scheduled_delivery_date < today),
+        ),
+    )
+
+def sweep_overdue(today=None, notify=True):
+    """Flag orders whose scheduled pickup or delivery date has passed.
+
+    Each SLA is one UPDATE ... RETURNING over the scheduled date index that
+    only touches orders not flagged yet, so concurrent sweeps of several
+    workers never flag or alert an order twice. Flags of orders that were
+    closed or rescheduled are cleared. Newly overdue orders are reported
+    in one Telegram message. Returns (new pickups, new deliveries, cleared).
+
+    The flags are derived from status and scheduled dates, so updated_at is
+    left unchanged: sweeps neither move orders forward in the change feed
+    nor postpone their archiving.
+    """
+    today = today or date.today()
+    now = datetime.utcnow()
+    flagged = []
+    cleared = 0
+
+    for flag, scheduled, condition in overdue_rules(today):
+        cleared += db.session.execute(
+            update(Order).where(flag.isnot(None), ~and_(scheduled.isnot(None), condition))
+            .values({flag: None, Order.updated_at: Order.updated_at})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        result = db.session.execute(
+            update(Order).where(flag.is_(None), condition)
+            .values({flag: now, Order.updated_at: Order.updated_at})
+            .returning(Order.id, Order.tracking_number, scheduled)
+            .execution_options(synchronize_session=False)
+        )
+        flagged.append(sorted((row._asdict() for row in result), key=lambda r: r[scheduled.key]))
+
+    db.session.commit()
+
+    pickups, deliveries = flagged
+    if pickups or deliveries or cleared:
+        bump_data_version()
+        logging.info(f"Overdue sweep: {len(pickups)} pickups, {len(deliveries)} deliveries flagged, {cleared} cleared")
+    if notify and (pickups or deliveries):
+        send_overdue_alert(pickups, deliveries)
+    return pickups, deliveries, cleared
+
+@event.listens_for(Session, 'before_flush')
+def _clear_stale_overdue_flags(session, flush_context, instances):
+    # Closing or rescheduling an order clears its flag right away instead of
+    # at the next sweep; new flags are only set by the sweep, which alerts
+    today = date.today()
+    for obj in session.dirty:
+        if not isinstance(obj, Order) or not obj.is_overdue:
+            continue
+        if obj.pickup_overdue_at and not (
+            obj.status in PICKUP_PENDING_STATUSES
+            and obj.scheduled_pickup_date and obj.scheduled_pickup_date < today
+        ):
+            obj.pickup_overdue_at = None
+        if obj.delivery_overdue_at and not (
+            obj.status not in CLOSED_STATUSES
+            and obj.scheduled_delivery_date and obj.scheduled_delivery_date < today
+        ):
+            obj.delivery_overdue_at = None
+
+def overdue_filter(model=Order):
+    return or_(model.pickup_overdue_at.isnot(None), model.delivery_overdue_at.isnot(None))
+
+_sweeper_started = False
+_sweeper_lock = threading.Lock()
+
+def start_sweeper(app, interval):
+    """Run sweep_overdue() at once and then every `interval` seconds in a daemon thread.
+
+    Sweeping first means flags are current right after a deploy or worker
+    restart instead of one interval later.
+    """
+    global _sweeper_started
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+
+    if not interval:
+        return
+
+    def loop():
+        while True:
+            with app.app_context():
+                try:
+                    sweep_overdue()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Overdue sweep failed: {str(e)}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="overdue-sweeper", daemon=True).start()
+
+def init_sla(app):
+    """Start the in-process sweeper and register the sweep CLI command"""
+
+    @app.before_request
+    def start_overdue_sweeper():
+        if not _sweeper_started:
+            start_sweeper(app, app.config.get('SLA_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL))
+
+    @app.cli.command('sweep-overdue')
+    @click.option('--no-alert', is_flag=True, help='Flag orders without sending the Telegram alert.')
+    def sweep_overdue_command(no_alert):
+        """Flag overdue pickups and deliveries and alert about new ones."""
+        pickups, deliveries, cleared = sweep_overdue(notify=not no_alert)
+        click.echo(f"Flagged {len(pickups)} pickups and {len(deliveries)} deliveries, cleared {cleared}")
@@ -0,0 +1,240 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime
+
+import click
+from sqlalchemy import func, update
+
+from app import db
+from cache import bump_data_version
+from geo import city_of
+from models import Order, Tariff
+
+try:
+    import numpy as np
+except ImportError:  # quote_many() falls back to a plain loop
+    np = None
+
+# Road freight convention: 1 m³ is charged as at least 250 kg
+VOLUMETRIC_KG_PER_M3 = 250
+# Quotes are rounded to whole tens of tenge
+ROUND_TO = 10
+
+DEFAULT_ZONES = {
+    'astana': 'city',
+    'kazakhstan': 'far',
+}
+
+# Destination cities of inter-city orders grouped by distance from Astana
+ZONE_CITIES = {
+    'near': {
+        'Караганда', 'Темиртау', 'Кокшетау', 'Павлодар', 'Экибастуз', 'Костанай',
+        'Петропавловск', 'Щучинск', 'Степногорск', 'Жезказган',
+    },
+    'far': {
+        'Алматы', 'Шымкент', 'Тараз', 'Кызылорда', 'Туркестан', 'Актобе', 'Атырау',
+        'Актау', 'Уральск', 'Усть-Каменогорск', 'Семей', 'Талдыкорган', 'Балхаш',
+    },
+}
+
+# (order_type, zone, max_weight, base_price, price_per_kg)
+DEFAULT_TARIFFS = [
+    ('astana', 'city', 50, 3000, 0),
+    ('astana', 'city', 500, 5000, 10),
+    ('astana', 'city', 1500, 10000, 8),
+    ('astana', 'city', None, 20000, 6),
+    ('kazakhstan', 'near', 50, 8000, 0),
+    ('kazakhstan', 'near', 500, 12000, 25),
+    ('kazakhstan', 'near', 3000, 25000, 20),
+    ('kazakhstan', 'near', None, 60000, 15),
+    ('kazakhstan', 'far', 50, 12000, 0),
+    ('kazakhstan', 'far', 500, 18000, 40),
+    ('kazakhstan', 'far', 3000, 40000, 30),
+    ('kazakhstan', 'far', None, 90000, 25),
+]
+
+PENDING_STATUSES = ['new', 'confirmed']
+
+def get_zone(order_type, pickup_address, delivery_address):
+    """Tariff zone of an order, derived from the city named in its addresses"""
+    if order_type == 'kazakhstan':
+        cities = {city_of(pickup_address), city_of(delivery_address)}
+        for zone in ('far', 'near'):
+            if cities & ZONE_CITIES[zone]:
+                return zone
+    return DEFAULT_ZONES.get(order_type)
+
+def chargeable_weight(weight, volume):
+    return max(weight or 0, (volume or 0) * VOLUMETRIC_KG_PER_M3)
+
+class TariffTable:
+    """Immutable in-memory copy of the tariff brackets.
+
+    Each (order_type, zone) group keeps its bracket upper bounds sorted in
+    a flat list next to parallel lists of base prices and per-kg rates, so a
+    quote is one dict lookup plus one binary search.
+    """
+
+    def __init__(self, rows):
+        grouped = {}
+        for order_type, zone, max_weight, base_price, price_per_kg in rows:
+            bound = float('inf') if max_weight is None else float(max_weight)
+            grouped.setdefault((order_type, zone), []).append((bound, base_price, price_per_kg or 0))
+
+        self.groups = {}
+        for key, brackets in grouped.items():
+            brackets.sort()
+            self.groups[key] = (
+                [b[0] for b in brackets],
+                [b[1] for b in brackets],
+                [b[2] for b in brackets],
+            )
+
+    def quote(self, order_type, zone, weight, volume):
+        """Price for one order, or None when no bracket matches"""
+        group = self.groups.get((order_type, zone))
+        if group is None:
+            return None
+        bounds, base_prices, rates = group
+        charged = chargeable_weight(weight, volume)
+        i = bisect.bisect_left(bounds, charged)
+        if i == len(bounds):
+            return None
+        return float(round((base_prices[i] + rates[i] * charged) / ROUND_TO) * ROUND_TO)
+
+    def quote_many(self, order_types, zones, weights, volumes):
+        """Vectorized quote() over parallel sequences; returns a list of prices"""
+        if np is None:
+            return [self.quote(*args) for args in zip(order_types, zones, weights, volumes)]
+
+        weights = np.array([w or 0 for w in weights], dtype=float)
+        volumes = np.array([v or 0 for v in volumes], dtype=float)
+        charged = np.maximum(weights, volumes * VOLUMETRIC_KG_PER_M3)
+        keys = np.array([f'{t}/{z}' for t, z in zip(order_types, zones)])
+        prices = np.full(len(charged), np.nan)
+
+        for (order_type, zone), (bounds, base_prices, rates) in self.groups.items():
+            mask = keys == f'{order_type}/{zone}'
+            if not mask.any():
+                continue
+            idx = np.searchsorted(np.array(bounds), charged[mask], side='left')
+            valid = idx < len(bounds)
+            idx = np.minimum(idx, len(bounds) - 1)
+            group_prices = np.array(base_prices)[idx] + np.array(rates)[idx] * charged[mask]
+            prices[mask] = np.where(valid, np.round(group_prices / ROUND_TO) * ROUND_TO, np.nan)
+
+        return [None if np.isnan(p) else float(p) for p in prices]
+
+# Seconds a worker uses its tariff table before checking whether the
+# rows changed, e.g. after another process edited them
+VERSION_CHECK_INTERVAL = 30
+
+_table = None
+_table_version = None
+_checked_at = 0.0
+_table_lock = threading.Lock()
+
+def tariff_version():
+    """Row count and newest updated_at of the tariffs; changes with every edit"""
+    return tuple(db.session.query(func.count(Tariff.id), func.max(Tariff.updated_at)).one())
+
+def get_tariff_table():
+    """Tariff table of this worker, reloaded when the tariff rows change.
+
+    The version is checked with one aggregate query at most every
+    VERSION_CHECK_INTERVAL seconds, so tariff edits reach every worker
+    within that interval without a restart.
+    """
+    global _table, _table_version, _checked_at
+    if _table is not None and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+        return _table
+    with _table_lock:
+        if _table is None or time.monotonic() - _checked_at >= VERSION_CHECK_INTERVAL:
+            version = tariff_version()
+            if _table is None or version != _table_version:
+                _table = load_tariff_table()
+                _table_version = version
+            _checked_at = time.monotonic()
+    return _table
+
+def load_tariff_table():
+    rows = db.session.query(
+        Tariff.order_type, Tariff.zone, Tariff.max_weight, Tariff.base_price, Tariff.price_per_kg
+    ).all()
+    return TariffTable(rows)
+
+def reload_tariffs():
+    global _table, _table_version, _checked_at
+    with _table_lock:
+        _table_version = tariff_version()
+        _table = load_tariff_table()
+        _checked_at = time.monotonic()
+    return _table
+
+def quote_order(order):
+    zone = get_zone(order.order_type, order.pickup_address, order.delivery_address)
+    return get_tariff_table().quote(order.order_type, zone, order.cargo_weight, order.cargo_volume)
+
+def seed_default_tariffs():
+    """Create the default rate table on an empty database"""
+    if Tariff.query.first():
+        return
+    for order_type, zone, max_weight, base_price, price_per_kg in DEFAULT_TARIFFS:
+        db.session.add(Tariff(
+            order_type=order_type,
+            zone=zone,
+            max_weight=max_weight,
+            base_price=base_price,
+            price_per_kg=price_per_kg
+        ))
+    db.session.commit()
+    logging.info("Default tariffs created")
+
+def reprice_orders(statuses=PENDING_STATUSES, batch_size=1000):
+    """Recompute quoted_price for all orders in the given statuses.
+
+    Only orders whose quote actually changes are written, so unchanged
+    orders keep their updated_at and stay out of the change feed. Returns
+    the number of re-priced orders.
+    """
+    table = reload_tariffs()
+    rows = db.session.query(
+        Order.id, Order.order_type, Order.pickup_address, Order.delivery_address,
+        Order.cargo_weight, Order.cargo_volume, Order.quoted_price
+    ).filter(Order.status.in_(statuses)).order_by(Order.id).all()
+
+    now = datetime.utcnow()
+    changed = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        prices = table.quote_many(
+            [r.order_type for r in batch],
+            [get_zone(r.order_type, r.pickup_address, r.delivery_address) for r in batch],
+            [r.cargo_weight for r in batch],
+            [r.cargo_volume for r in batch],
+        )
+        updates = [
+            {'id': r.id, 'quoted_price': price, 'updated_at': now}
+            for r, price in zip(batch, prices)
+            if price != r.quoted_price
+        ]
+        if updates:
+            db.session.execute(update(Order), updates)
+            db.session.commit()
+            changed += len(updates)
+
+    if changed:
+        bump_data_version()
+    return changed
+
+def init_tariffs(app):
+    """Register the bulk re-pricing CLI command"""
+
+    @app.cli.command('reprice-orders')
+    @click.option('--status', 'statuses', multiple=True, help='Order status to re-price (repeatable).')
+    def reprice_orders_command(statuses):
+        """Recompute tariff quotes for pending orders after tariffs change."""
+        count = reprice_orders(list(statuses) or PENDING_STATUSES)
+        click.echo(f"Re-priced {count} orders")
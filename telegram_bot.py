@@ -109,3 +109,45 @@ def send_status_update_notification(order, old_status, new_status):
     except Exception as e:
         logging.error(f"Error sending status update notification: {e}")
         return False
+
+def send_overdue_alert(pickups, deliveries, limit=30):
+    """Send one summary message about orders that became overdue in a sweep"""
+    
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return False
+    
+    try:
+        lines = [f"⏰ *Просроченные заказы: {len(pickups) + len(deliveries)}*", ""]
+        for title, orders, date_key in (
+            ('Забор', pickups, 'scheduled_pickup_date'),
+            ('Доставка', deliveries, 'scheduled_delivery_date')
+        ):
+            if not orders:
+                continue
+            lines.append(f"*{title} ({len(orders)}):*")
+            for order in orders[:limit]:
+                lines.append(f"• `{order['tracking_number']}` — план {order[date_key].strftime('%d.%m.%Y')}")
+            if len(orders) > limit:
+                lines.append(f"… и ещё {len(orders) - limit}")
+            lines.append("")
+        
+        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        
+        data = {
+            'chat_id': TELEGRAM_CHAT_ID,
+            'text': "\n".join(lines),
+            'parse_mode': 'Markdown'
+        }
+        
+        response = requests.post(url, data=data, timeout=10)
+        
+        if response.status_code == 200:
+            logging.info(f"Overdue alert sent for {len(pickups) + len(deliveries)} orders")
+            return True
+        else:
+            logging.error(f"Failed to send overdue alert: {response.status_code} - {response.text}")
+            return False
+            
+    except Exception as e:
+        logging.error(f"Error sending overdue alert: {e}")
+        return False
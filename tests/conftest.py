@@ -0,0 +1,86 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# The app reads its configuration at import time: point it at a scratch
+# database and keep background threads off before importing it
+_tmp = tempfile.mkdtemp(prefix='logpi-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(_tmp, 'jinja_cache')
+os.environ['SLA_SWEEP_INTERVAL'] = '0'
+os.environ['SQLITE_MAINTENANCE_INTERVAL'] = '0'
+os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ.pop('RATE_LIMIT_REDIS_URL', None)
+
+from app import app as flask_app, db  # noqa: E402
+from addresses import set_order_addresses  # noqa: E402
+from models import Order  # noqa: E402
+from cache import fragment_cache  # noqa: E402
+from reference import reference_cache  # noqa: E402
+
+_tracking_numbers = itertools.count(1)
+
+# Rows created at startup that every test relies on
+KEEP_TABLES = ('user', 'tariff')
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        yield flask_app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name not in KEEP_TABLES:
+                db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+        reference_cache.bump_version()
+        fragment_cache.clear()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def logist_client(client):
+    client.post('/login', data={'email': 'admin@xpom-kz.com', 'password': 'admin123'})
+    return client
+
+@pytest.fixture
+def make_order(app):
+    """Factory adding a committed order; keyword arguments override the defaults.
+
+    Addresses go to the address dictionary like those of submitted orders,
+    unless *_address_text is given for an order saved before it existed.
+    """
+    def make(pickup_address='г. Астана, ул. Кенесары 40', delivery_address='г. Астана, пр. Республики 1', **kwargs):
+        values = {
+            'tracking_number': f'TEST-{next(_tracking_numbers):06d}',
+            'customer_name': 'Тестовый клиент',
+            'customer_phone': '+77010000000',
+            'order_type': 'astana',
+            'cargo_description': 'Коробки',
+        }
+        values.update(kwargs)
+        order = Order(**values)
+        if order.pickup_address_text is None:
+            set_order_addresses(order, pickup_address, delivery_address)
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make
+
+@pytest.fixture
+def sql_statements(app):
+    """SQL statements sent to the database while the test runs"""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
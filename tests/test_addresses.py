@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from addresses import backfill_addresses, resolve_address
+from app import db
+from changefeed import fetch_changes
+from geo import normalize_address
+from models import Address, Order
+
+LEGACY = {
+    'pickup_address_text': 'г. Астана, ул. Кенесары 40',
+    'delivery_address_text': 'г. Караганда, ул. Ерубаева 1',
+}
+
+SPELLINGS = [
+    'г. Астана, ул. Кенесары, д. 40',
+    'АСТАНА улица Кенесары дом 40',
+    'город Астана, Ул Кенесары,  Д 40',
+]
+
+def test_spellings_of_one_address_normalize_alike():
+    assert {normalize_address(text) for text in SPELLINGS} == {('Астана', 'ул. кенесары д. 40')}
+    assert normalize_address('г. Астана, ул. Кенесары, д. 41') != normalize_address(SPELLINGS[0])
+    assert normalize_address('г. Караганда, ул. Кенесары, д. 40')[0] == 'Караганда'
+
+def test_spellings_share_one_address_row(app):
+    ids = {resolve_address(text)[0] for text in SPELLINGS}
+    db.session.commit()
+
+    assert len(ids) == 1
+    assert db.session.query(Address).count() == 1
+
+def test_new_orders_store_addresses_in_the_dictionary_only(make_order):
+    order_id = make_order(delivery_address='г. Караганда, ул. Ерубаева 1').id
+    db.session.expire_all()
+
+    order = db.session.get(Order, order_id)
+    assert order.pickup_address_text is None and order.delivery_address_text is None
+    assert order.delivery_address == 'г. Караганда, ул. Ерубаева 1'
+    assert order.delivery_address_record.city == 'Караганда'
+    assert db.session.query(Order.delivery_address).filter(Order.id == order_id).scalar() == order.delivery_address
+
+def test_legacy_orders_fall_back_to_their_text(make_order):
+    order = make_order(**LEGACY)
+
+    assert order.pickup_address_id is None
+    assert order.delivery_address == 'г. Караганда, ул. Ерубаева 1'
+    assert db.session.query(Order.delivery_address).filter(Order.id == order.id).scalar() == order.delivery_address
+
+def test_backfill_moves_text_into_the_dictionary_and_keeps_updated_at(make_order):
+    updated_at = datetime(2030, 1, 2, 3, 4, 5)
+    order_id = make_order(updated_at=updated_at, **LEGACY).id
+
+    assert backfill_addresses() == 1
+    assert backfill_addresses() == 0
+
+    db.session.expire_all()
+    order = db.session.get(Order, order_id)
+    assert order.origin_city == 'Астана'
+    assert order.destination_city == 'Караганда'
+    assert order.pickup_address_text is None and order.delivery_address_text is None
+    assert (order.pickup_address, order.delivery_address) == (LEGACY['pickup_address_text'], LEGACY['delivery_address_text'])
+    assert order.updated_at == updated_at
+
+def test_change_feed_reads_addresses_from_the_dictionary(make_order):
+    make_order(delivery_address='г. Караганда, ул. Ерубаева 1', updated_at=datetime(2020, 1, 1))
+    make_order(updated_at=datetime(2020, 1, 2), **LEGACY)
+
+    orders, _, _ = fetch_changes()
+
+    assert [o['delivery_address'] for o in orders] == ['г. Караганда, ул. Ерубаева 1'] * 2
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+import archive
+from app import db
+from archive import archive_closed_orders, find_order_by_tracking_number, find_tracking_rows
+from models import ArchivedOrder, ArchivedOrderStatusHistory, Order, OrderStatusHistory
+
+OLD = datetime(2020, 1, 1)
+
+def make_closed(make_order, **kwargs):
+    order = make_order(status='delivered', updated_at=OLD, **kwargs)
+    db.session.add(OrderStatusHistory(order_id=order.id, status='delivered'))
+    db.session.commit()
+    return order.id, order.tracking_number
+
+def test_only_old_closed_orders_are_archived(make_order):
+    closed_id, _ = make_closed(make_order)
+    recent = make_order(status='delivered').id
+    open_order = make_order(status='new', updated_at=OLD).id
+
+    assert archive_closed_orders(days=90) == 1
+
+    assert db.session.get(ArchivedOrder, closed_id) is not None
+    assert db.session.query(ArchivedOrderStatusHistory).filter_by(order_id=closed_id).count() == 1
+    assert db.session.query(OrderStatusHistory).filter_by(order_id=closed_id).count() == 0
+    assert {o.id for o in Order.query} == {recent, open_order}
+
+def test_order_reopened_after_select_stays_live(make_order, monkeypatch):
+    reopened, _ = make_closed(make_order)
+    archived, _ = make_closed(make_order)
+    copy_rows = archive.copy_rows
+
+    def reopen_then_copy(source, target, where):
+        # As if a logist reopened the order between the select and the copy
+        db.session.execute(update(Order).where(Order.id == reopened).values(status='new', updated_at=datetime.utcnow()))
+        return copy_rows(source, target, where)
+    monkeypatch.setattr(archive, 'copy_rows', reopen_then_copy)
+
+    assert archive_closed_orders(days=90) == 1
+
+    assert db.session.get(Order, reopened).status == 'new'
+    assert db.session.get(ArchivedOrder, reopened) is None
+    assert db.session.query(OrderStatusHistory).filter_by(order_id=reopened).count() == 1
+    assert db.session.get(ArchivedOrder, archived) is not None
+
+def test_tracking_lookups_fall_back_to_the_archive(make_order):
+    _, archived_number = make_closed(make_order)
+    live_number = make_order().tracking_number
+    archive_closed_orders(days=90)
+
+    assert isinstance(find_order_by_tracking_number(archived_number), ArchivedOrder)
+    assert isinstance(find_order_by_tracking_number(live_number), Order)
+    assert find_order_by_tracking_number('AST-0000-000') is None
+
+    rows = find_tracking_rows([live_number, archived_number, 'AST-0000-000'], ['tracking_number', 'status'])
+    assert {number: row.status for number, row in rows.items()} == {
+        live_number: 'new', archived_number: 'delivered'
+    }
@@ -0,0 +1,35 @@
+from assets import VENDOR_ASSETS, minify_js
+
+def test_minify_js_drops_comments_and_whitespace():
+    source = """
+    /* Block comment
+       over two lines */
+    function add(a, b) {
+        // line comment
+        return a + b;
+    }
+    """
+
+    assert minify_js(source) == 'function add(a,b){return a+b;}\n'
+
+def test_minify_js_keeps_strings_and_template_literals():
+    source = """
+    const url = "https://example.com//path"; // trailing comment
+    const pattern = '/* not a comment */';
+    const text = `first line
+    // still text
+        indented /* text */`;
+    const slashes = /\\/\\/+/g;
+    """
+
+    minified = minify_js(source)
+
+    assert '"https://example.com//path"' in minified
+    assert "'/* not a comment */'" in minified
+    assert '`first line\n    // still text\n        indented /* text */`' in minified
+    assert '/\\/\\/+/g' in minified
+    assert 'trailing comment' not in minified
+
+def test_vendor_assets_are_pinned():
+    for url in VENDOR_ASSETS.values():
+        assert '@' in url or '/ajax/libs/' in url, url
@@ -0,0 +1,46 @@
+from app import db
+from cache import fragment_cache
+from models import User
+
+def test_order_commit_bumps_version(make_order):
+    order = make_order()
+    version = fragment_cache.version
+
+    order.status = 'confirmed'
+    db.session.commit()
+
+    assert fragment_cache.version == version + 1
+
+def test_rollback_does_not_bump_version(make_order):
+    order = make_order()
+    version = fragment_cache.version
+
+    order.status = 'confirmed'
+    db.session.flush()
+    db.session.rollback()
+
+    assert fragment_cache.version == version
+
+def test_other_models_do_not_bump_version(app):
+    version = fragment_cache.version
+
+    db.session.add(User(full_name='Клиент', email='cache-test@example.com', phone='+77010000001'))
+    db.session.commit()
+
+    assert fragment_cache.version == version
+
+def test_cached_value_is_dropped_after_commit(make_order):
+    order = make_order()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return len(calls)
+
+    assert fragment_cache.get_or_set(['test', 'counter'], factory) == 1
+    assert fragment_cache.get_or_set(['test', 'counter'], factory) == 1
+
+    order.status = 'confirmed'
+    db.session.commit()
+
+    assert fragment_cache.get_or_set(['test', 'counter'], factory) == 2
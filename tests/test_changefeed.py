@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from changefeed import decode_cursor, encode_cursor, fetch_changes
+from models import Order
+
+def test_cursor_round_trip():
+    updated_at = datetime(2030, 5, 1, 12, 30, 15, 123456)
+
+    assert decode_cursor(encode_cursor(updated_at, 42)) == (updated_at, 42)
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', 'MjAzMC0wNS0wMQ'])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def set_updated_at(order, updated_at):
+    db.session.execute(Order.__table__.update().where(Order.id == order.id).values(updated_at=updated_at))
+    db.session.commit()
+
+def test_pages_cover_every_change_once(make_order):
+    # Several orders share a timestamp, so pages must split on the id
+    base = datetime.utcnow() - timedelta(hours=1)
+    orders = [make_order() for _ in range(7)]
+    for i, order in enumerate(orders):
+        set_updated_at(order, base + timedelta(seconds=i // 3))
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor, has_more = fetch_changes(cursor, limit=2)
+        seen += [row['id'] for row in page]
+        if not has_more:
+            break
+
+    assert seen == [order.id for order in orders]
+    # Polling with the last cursor returns nothing new but keeps the cursor
+    assert fetch_changes(cursor, limit=2) == ([], cursor, False)
+
+    set_updated_at(orders[0], base + timedelta(minutes=5))
+    page, _, _ = fetch_changes(cursor, limit=2)
+    assert [row['id'] for row in page] == [orders[0].id]
+
+def test_unsettled_changes_are_held_back(make_order):
+    make_order()
+
+    assert fetch_changes()[0] == []
+
+def test_api_rejects_bad_cursor(logist_client):
+    assert logist_client.get('/api/changes?cursor=garbage').status_code == 400
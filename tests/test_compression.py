@@ -0,0 +1,132 @@
+import gzip
+import sys
+import zlib
+
+import pytest
+
+import compression
+from compression import CompressionMiddleware
+
+BODY = b'<p>' + b'Astana ' * 200 + b'</p>'
+
+def html_app(body=BODY, content_type='text/html; charset=utf-8', headers=()):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(body))), *headers])
+        return [body]
+    return app
+
+def call(app, accept_encoding='gzip', **kwargs):
+    """(status, headers dict, body chunks, exc_info) of a GET through the middleware"""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started.append((status, dict(headers), exc_info))
+
+    result = CompressionMiddleware(app, **kwargs)(
+        {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding}, start_response
+    )
+    chunks = list(result)
+    if hasattr(result, 'close'):
+        result.close()
+    status, headers, exc_info = started[-1]
+    return status, headers, chunks, exc_info
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('br;q=1.0, gzip;q=0.8', 'br' if compression.brotli else 'gzip'),
+    ('br', 'br' if compression.brotli else None),
+    ('gzip;q=0', None),
+    ('identity', None),
+    ('', None),
+])
+def test_encoding_is_negotiated_from_accept_encoding(accept_encoding, expected):
+    _, headers, chunks, _ = call(html_app(), accept_encoding)
+
+    assert headers.get('Content-Encoding') == expected
+    if expected == 'gzip':
+        assert gzip.decompress(b''.join(chunks)) == BODY
+    elif expected is None:
+        assert b''.join(chunks) == BODY
+
+def test_small_responses_are_not_compressed():
+    _, headers, chunks, _ = call(html_app(b'<p>short</p>'))
+
+    assert 'Content-Encoding' not in headers
+    assert b''.join(chunks) == b'<p>short</p>'
+
+def test_other_content_types_are_not_compressed():
+    _, headers, chunks, _ = call(html_app(content_type='image/png'))
+
+    assert 'Content-Encoding' not in headers
+    assert b''.join(chunks) == BODY
+
+def test_vary_is_extended_and_content_length_dropped():
+    _, headers, _, _ = call(html_app(headers=[('Vary', 'Cookie'), ('ETag', '"abc"')]))
+
+    assert headers['Vary'] == 'Cookie, Accept-Encoding'
+    assert headers['ETag'] == 'W/"abc"'
+    assert 'Content-Length' not in headers
+
+def test_lazy_streamed_response_is_flushed_on_empty_chunk():
+    received = []
+    seen_before_second_part = []
+
+    def app(environ, start_response):
+        # A generator: start_response only runs on the first iteration
+        start_response('200 OK', [('Content-Type', 'text/csv')])
+        yield b'a,b\n' * 200
+        yield b''
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        seen_before_second_part.append(decoder.decompress(b''.join(received)))
+        yield b'c,d\n' * 200
+
+    started = []
+    result = CompressionMiddleware(app, flush_size=1024 * 1024)(
+        {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, lambda *args: started.append(args)
+    )
+    for chunk in result:
+        received.append(chunk)
+
+    assert dict(started[0][1])['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(b''.join(received)) == b'a,b\n' * 200 + b'c,d\n' * 200
+    # Everything before the empty chunk reached the client before the rest
+    assert seen_before_second_part == [b'a,b\n' * 200]
+
+def test_streamed_chunks_are_not_flushed_one_by_one():
+    flushes = []
+
+    class CountingCompressor(compression.GzipCompressor):
+        def flush(self):
+            flushes.append(True)
+            return super().flush()
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return (b'line %d\n' % i for i in range(2000))
+
+    middleware = CompressionMiddleware(app, flush_size=4096)
+    middleware.make_compressor = lambda encoding: CountingCompressor(6)
+    body = b''.join(middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, lambda *args: None))
+
+    assert gzip.decompress(body) == b''.join(b'line %d\n' % i for i in range(2000))
+    assert 0 < len(flushes) < 10
+
+def test_exc_info_is_passed_on():
+    def app(environ, start_response):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            start_response('500 INTERNAL SERVER ERROR', [('Content-Type', 'text/html')], sys.exc_info())
+        return [BODY]
+
+    status, headers, chunks, exc_info = call(app)
+
+    assert status.startswith('500')
+    assert exc_info[0] is ValueError
+    assert gzip.decompress(b''.join(chunks)) == BODY
+
+def test_app_responses_vary_on_accept_encoding(client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
@@ -0,0 +1,73 @@
+import pytest
+
+from app import db
+
+def status_url(order):
+    return f'/order_success/{order.tracking_number}'
+
+def test_unchanged_order_page_is_not_modified(client, make_order):
+    order = make_order()
+    first = client.get(status_url(order))
+    etag = first.headers['ETag']
+
+    assert first.status_code == 200
+    again = client.get(status_url(order), headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+@pytest.mark.parametrize('if_none_match', [
+    '"{}"',
+    'W/"{}"',
+    '"other", "{}"',
+    '"other", W/"{}"',
+])
+def test_weak_and_list_forms_match(client, make_order, if_none_match):
+    order = make_order()
+    etag = client.get(status_url(order)).get_etag()[0]
+
+    response = client.get(status_url(order), headers={'If-None-Match': if_none_match.format(etag)})
+
+    assert response.status_code == 304
+
+def test_other_etags_get_the_page(client, make_order):
+    order = make_order()
+    client.get(status_url(order))
+
+    response = client.get(status_url(order), headers={'If-None-Match': '"other"'})
+
+    assert response.status_code == 200
+
+def test_changed_order_gets_the_page_again(client, make_order):
+    order = make_order()
+    etag = client.get(status_url(order)).headers['ETag']
+
+    order.status = 'confirmed'
+    db.session.commit()
+    response = client.get(status_url(order), headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_anonymous_pages_are_public(client, make_order):
+    response = client.get(status_url(make_order()))
+
+    assert response.cache_control.public
+    assert not response.cache_control.private
+    assert response.cache_control.no_cache
+    assert 'Cookie' in response.vary
+
+def test_logged_in_pages_are_private_and_keyed_by_viewer(client, make_order):
+    order = make_order()
+    anonymous_etag = client.get(status_url(order)).headers['ETag']
+    client.post('/login', data={'email': 'admin@xpom-kz.com', 'password': 'admin123'}, follow_redirects=True)
+
+    response = client.get(status_url(order), headers={'If-None-Match': anonymous_etag})
+
+    # The anonymous copy may not be reused once the cookie names a user
+    assert response.status_code == 200
+    assert response.headers['ETag'] != anonymous_etag
+    assert response.cache_control.private
+    assert not response.cache_control.public
+    assert 'Cookie' in response.vary
+    assert client.get(status_url(order), headers={'If-None-Match': response.headers['ETag']}).status_code == 304
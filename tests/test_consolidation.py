@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from consolidation import propose_loads
+from dispatch import TRANSIT_DAYS
+
+from test_dispatch import START, add_driver
+
+# Created long enough ago that the orders cannot wait any longer
+OVERDUE = datetime.combine(START - timedelta(days=10), datetime.min.time())
+
+def make_trip(make_order, **kwargs):
+    values = {
+        'order_type': 'kazakhstan',
+        'delivery_address': 'г. Караганда, ул. Ерубаева 1',
+        'created_at': OVERDUE,
+    }
+    values.update(kwargs)
+    return make_order(**values)
+
+def test_fill_is_measured_against_the_chosen_vehicle(make_order):
+    small = add_driver(max_weight=1000, max_volume=10)
+    add_driver(max_weight=20000, max_volume=82)
+    make_trip(make_order, cargo_weight=900, cargo_volume=2)
+
+    [load] = propose_loads(today=START)['loads']
+
+    assert load.driver_id == small.id
+    assert load.fill() == 0.9
+
+def test_planned_trip_reserves_driver_until_delivery(make_order):
+    driver = add_driver()
+    make_trip(make_order, status='confirmed', driver_id=driver.id,
+              scheduled_pickup_date=START - timedelta(days=1),
+              scheduled_delivery_date=START + timedelta(days=1))
+    make_trip(make_order, cargo_weight=500)
+
+    [load] = propose_loads(today=START)['loads']
+
+    assert load.pickup_date == START + timedelta(days=2)
+
+def test_proposed_load_reserves_driver_for_whole_trip(make_order):
+    add_driver()
+    make_trip(make_order, cargo_weight=500)
+    make_trip(make_order, cargo_weight=500, delivery_address='г. Павлодар, ул. Лермонтова 1')
+
+    loads = propose_loads(today=START)['loads']
+
+    assert sorted(load.pickup_date for load in loads) == [
+        START, START + timedelta(days=TRANSIT_DAYS['kazakhstan'] + 1)
+    ]
+
+def test_consolidate_names_driver_and_fill_of_its_vehicle(logist_client, make_order):
+    driver = add_driver(max_weight=1000, max_volume=10)
+    add_driver(max_weight=20000, max_volume=82)
+    make_trip(make_order, cargo_weight=900, cargo_volume=2)
+
+    response = logist_client.post('/admin/calendar/consolidate')
+
+    [load] = response.get_json()['loads']
+    assert load['driver_name'] == driver.full_name
+    assert load['fill'] == 90
@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+
+from app import db
+from dispatch import TRANSIT_DAYS, propose_assignments
+from models import Driver, DriverUnavailability
+from reference import get_active_drivers, reference_cache
+
+START = date(2030, 3, 4)
+
+def add_driver(**kwargs):
+    driver = Driver(full_name='Водитель', phone='+77010000002', **kwargs)
+    db.session.add(driver)
+    db.session.commit()
+    return driver
+
+def by_order(proposals):
+    return {p['order_id']: p for p in proposals}
+
+def test_intercity_trip_is_delivered_after_transit(make_order):
+    add_driver(max_orders_per_day=5)
+    trip = make_order(order_type='kazakhstan', cargo_weight=500)
+    local = make_order(order_type='astana', cargo_weight=10)
+
+    proposals, unassigned = propose_assignments(START, horizon_days=7)
+    proposals = by_order(proposals)
+
+    assert not unassigned
+    assert proposals[trip.id]['pickup_date'] == START
+    assert proposals[trip.id]['delivery_date'] == START + timedelta(days=TRANSIT_DAYS['kazakhstan'])
+    # Other shipments may share the pickup day
+    assert proposals[local.id]['pickup_date'] == START
+
+def test_scheduled_trip_blocks_later_days(make_order):
+    driver = add_driver(max_orders_per_day=5)
+    make_order(order_type='kazakhstan', status='confirmed', driver_id=driver.id,
+               scheduled_pickup_date=START - timedelta(days=1),
+               scheduled_delivery_date=START + timedelta(days=1))
+    order = make_order(order_type='astana')
+
+    proposals, _ = propose_assignments(START, horizon_days=7)
+
+    assert by_order(proposals)[order.id]['pickup_date'] == START + timedelta(days=2)
+
+def test_trip_needs_driver_free_on_every_day(make_order):
+    driver = add_driver()
+    db.session.add(DriverUnavailability(driver_id=driver.id, date=START + timedelta(days=1)))
+    db.session.commit()
+    order = make_order(order_type='kazakhstan')
+
+    proposals, _ = propose_assignments(START, horizon_days=7)
+
+    assert by_order(proposals)[order.id]['pickup_date'] == START + timedelta(days=2)
+
+def test_proposed_trip_reserves_driver(make_order):
+    add_driver(max_orders_per_day=1)
+    trip = make_order(order_type='kazakhstan', cargo_weight=500)
+    local = make_order(order_type='astana', cargo_weight=10)
+
+    proposals, _ = propose_assignments(START, horizon_days=7)
+    proposals = by_order(proposals)
+
+    assert proposals[trip.id]['pickup_date'] == START
+    assert proposals[local.id]['pickup_date'] == START + timedelta(days=TRANSIT_DAYS['kazakhstan'] + 1)
+
+def test_auto_assign_names_drivers_missing_from_reference_cache(logist_client, make_order):
+    get_active_drivers()
+    driver = add_driver()
+    make_order()
+    # As if another worker added the driver: this worker keeps its cached list
+    reference_cache.version -= 1
+
+    response = logist_client.post('/admin/calendar/auto_assign')
+
+    assert response.status_code == 200
+    assert response.get_json()['proposals'][0]['driver_name'] == driver.full_name
@@ -0,0 +1,29 @@
+from app import db
+from models import Order
+from routes import get_order_facets
+
+def test_facets_follow_writes_of_other_workers(make_order):
+    make_order(status='new', order_type='astana')
+    make_order(status='new', order_type='kazakhstan')
+    order = make_order(status='delivered', order_type='astana')
+
+    assert get_order_facets('', '')['status'] == {'new': 2, 'delivered': 1}
+
+    # A write that no session event of this worker saw
+    db.session.execute(Order.__table__.update().where(Order.id == order.id).values(status='new'))
+
+    facets = get_order_facets('', 'astana')
+    assert facets['status'] == {'new': 2}
+    assert facets['type'] == {'astana': 2, 'kazakhstan': 1}
+    assert facets['total_status'] == 2
+
+def test_facets_match_list(logist_client, make_order):
+    shown = make_order(status='confirmed', order_type='kazakhstan')
+    hidden = make_order(status='new', order_type='kazakhstan')
+
+    page = logist_client.get('/admin/orders?status=confirmed').get_data(as_text=True)
+    facets = logist_client.get('/admin/orders/facets?status=confirmed').get_json()
+
+    assert facets['type'] == {'kazakhstan': 1}
+    assert shown.tracking_number in page
+    assert hidden.tracking_number not in page
@@ -0,0 +1,33 @@
+import pytest
+
+from geo import city_of, lane_of, normalize_address
+
+@pytest.mark.parametrize('address, city', [
+    ('г. Астана, ул. Кенесары 40', 'Астана'),
+    ('доставка в Караганду', 'Караганда'),
+    ('из Нур-Султана', 'Астана'),
+    ('Павлодар, склад 3', 'Павлодар'),
+    ('город Алматы, пр. Абая 1', 'Алматы'),
+    ('ул. Неизвестная 1', None),
+    ('', None),
+])
+def test_cities_are_found_in_their_declensions(address, city):
+    assert city_of(address) == city
+
+@pytest.mark.parametrize('address, city', [
+    # Street names derived from city names are no city mention
+    ('ул. Семейная 5, г. Алматы', 'Алматы'),
+    ('ул. Семейная 5', None),
+    ('ул. Актауская 12, Атырау', 'Атырау'),
+    ('мкр. Астанинский, Шымкент', 'Шымкент'),
+    ('Павлодарская обл., Экибастуз', 'Экибастуз'),
+    # The city named as such wins over other places mentioned before it
+    ('ТЦ Балхаш, г. Караганда', 'Караганда'),
+    ('склад Темиртау, город Караганда', 'Караганда'),
+])
+def test_street_names_are_not_taken_for_cities(address, city):
+    assert city_of(address) == city
+
+def test_named_city_is_dropped_from_the_normalized_address():
+    assert normalize_address('ул. Семейная 5, г. Алматы') == ('Алматы', 'ул. семейная 5')
+    assert lane_of('ул. Актауская 12, г. Атырау', 'г. Актау') == ('Атырау', 'Актау')
@@ -0,0 +1,25 @@
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+
+from archive import archive_closed_orders
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+def test_report_export_streams_live_and_archived_orders(logist_client, make_order):
+    live = make_order(price=1000, created_at=datetime(2030, 1, 5)).tracking_number
+    archived = make_order(price=2000, created_at=datetime(2030, 1, 6), status='delivered',
+                          updated_at=datetime(2020, 1, 7)).tracking_number
+    make_order(price=3000, created_at=datetime(2030, 2, 5))
+    assert archive_closed_orders(days=0) == 1
+
+    response = logist_client.get('/admin/financial_reports?start_date=2030-01-01&end_date=2030-01-31&export=parquet')
+
+    assert response.status_code == 200
+    table = pq.read_table(BytesIO(response.data))
+    rows = {row['tracking_number']: row for row in table.to_pylist()}
+    assert set(rows) == {live, archived}
+    assert rows[live]['archived'] is False
+    assert rows[archived]['archived'] is True
+    assert rows[archived]['price'] == 2000
@@ -0,0 +1,24 @@
+from profiler import category_of
+
+REQUEST = ('threading:run', 'werkzeug.serving:run_wsgi', 'flask.app:wsgi_app', 'flask.app:dispatch_request')
+
+def test_view_busy_in_its_own_code_is_app():
+    assert category_of(REQUEST + ('routes:admin_calendar',)) == 'app'
+    # Standard library calls count towards the view that made them
+    assert category_of(REQUEST + ('routes:admin_calendar', 're:sub')) == 'app'
+
+def test_queries_count_as_sqlalchemy():
+    stack = REQUEST + ('routes:admin_orders', 'sqlalchemy.orm.query:all', 'sqlalchemy.engine.base:execute')
+    assert category_of(stack) == 'sqlalchemy'
+
+def test_templates_count_as_jinja():
+    stack = REQUEST + ('routes:index', 'flask.templating:render_template', 'template:index.html:root')
+    assert category_of(stack) == 'jinja'
+    assert category_of(stack + ('jinja2.runtime:call',)) == 'jinja'
+
+def test_template_filters_count_as_filters():
+    stack = REQUEST + ('routes:admin_orders', 'template:admin/orders.html:root', 'utils:format_phone')
+    assert category_of(stack) == 'filters'
+
+def test_framework_code_outside_views_is_framework():
+    assert category_of(REQUEST + ('flask.app:preprocess_request',)) == 'framework'
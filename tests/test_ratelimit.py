@@ -0,0 +1,68 @@
+import time
+
+from flask import g, session
+
+from app import db
+from ratelimit import RateLimiter, client_key, load_shedder
+
+def test_client_key_needs_no_query(app, sql_statements):
+    with app.test_request_context('/api/track', environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert client_key() == 'ip:10.0.0.1'
+        session['_user_id'] = '7'
+        assert client_key() == 'user:7'
+    assert sql_statements == []
+
+def test_throttled_tracking_api_request_costs_no_query(logist_client, monkeypatch, sql_statements):
+    from routes import tracking_api_limiter
+    monkeypatch.setattr(tracking_api_limiter, 'hit', lambda key: 30)
+    # Forget the user loaded at login, as a new request would
+    g.pop('_login_user', None)
+    db.session.remove()
+
+    response = logist_client.post('/api/track', json={'tracking_numbers': ['AST-2030-001']})
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    assert sql_statements == []
+
+def test_public_endpoint_is_shed_beyond_in_flight_limit(client, monkeypatch):
+    monkeypatch.setattr(load_shedder, 'max_in_flight', 2)
+    # Two other requests in progress: this one is the third
+    load_shedder.enter()
+    load_shedder.enter()
+    try:
+        response = client.post('/api/track', json={'tracking_numbers': ['AST-2030-001']})
+    finally:
+        load_shedder.leave()
+        load_shedder.leave()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert load_shedder.in_flight == 0
+
+def test_public_endpoint_is_served_at_in_flight_limit(client, monkeypatch):
+    monkeypatch.setattr(load_shedder, 'max_in_flight', 2)
+    load_shedder.enter()
+    try:
+        response = client.post('/api/track', json={'tracking_numbers': ['AST-2030-001']})
+    finally:
+        load_shedder.leave()
+
+    assert response.status_code == 200
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    limiter = RateLimiter(limit=60, period=60, burst=2)
+
+    assert limiter.hit('client') == 0
+    assert limiter.hit('client') == 0
+    assert limiter.hit('client') == 1
+    # One token per second comes back, never more than the burst
+    now[0] += 1
+    assert limiter.hit('client') == 0
+    assert limiter.hit('client') == 1
+    now[0] += 60
+    assert limiter.hit('client') == 0
+    assert limiter.hit('client') == 0
+    assert limiter.hit('client') == 1
@@ -0,0 +1,21 @@
+from sqlalchemy import update
+
+import reference
+from app import db
+from models import Driver
+from reference import get_drivers
+
+def test_driver_changes_of_other_workers_are_picked_up(app, monkeypatch):
+    driver = Driver(full_name='Старое имя', phone='+77010000002')
+    db.session.add(driver)
+    db.session.commit()
+    assert [d.full_name for d in get_drivers()] == ['Старое имя']
+
+    # Another worker renames the driver: this worker's session sees no write
+    db.session.execute(update(Driver).where(Driver.id == driver.id).values(full_name='Новое имя'))
+    db.session.commit()
+    assert [d.full_name for d in get_drivers()] == ['Старое имя']
+
+    # The next version check after the interval reloads the drivers
+    monkeypatch.setattr(reference, '_checked_at', reference._checked_at - reference.VERSION_CHECK_INTERVAL)
+    assert [d.full_name for d in get_drivers()] == ['Новое имя']
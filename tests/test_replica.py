@@ -0,0 +1,85 @@
+import pytest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+import replica
+from replica import RoutingSession, primary_reads, read_replica
+
+@pytest.fixture
+def routed(tmp_path):
+    """App with a primary and a replica SQLite file whose rows tell them apart"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS={replica.REPLICA_BIND_KEY: f"sqlite:///{tmp_path / 'replica.db'}"},
+        DATABASE_REPLICA_STICKY_SECONDS=10,
+        DATABASE_REPLICA_MAX_LAG=0,
+    )
+
+    class Base(DeclarativeBase):
+        pass
+
+    db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+    db.init_app(app)
+
+    class Item(db.Model):
+        __tablename__ = 'replica_test_item'
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(20))
+
+    @app.route('/items')
+    @read_replica
+    def items():
+        return jsonify([item.name for item in Item.query.order_by(Item.id)])
+
+    @app.route('/items/primary')
+    @read_replica
+    def items_from_primary():
+        with primary_reads():
+            return jsonify([item.name for item in Item.query.order_by(Item.id)])
+
+    @app.route('/items', methods=['POST'])
+    def add_item():
+        db.session.add(Item(name='new'))
+        db.session.commit()
+        return jsonify([item.name for item in Item.query.order_by(Item.id)])
+
+    with app.app_context():
+        for engine in db.engines.values():
+            Base.metadata.create_all(engine)
+        with db.engines[None].begin() as conn:
+            conn.execute(Item.__table__.insert(), {'name': 'primary'})
+        with db.engines[replica.REPLICA_BIND_KEY].begin() as conn:
+            conn.execute(Item.__table__.insert(), {'name': 'replica'})
+
+    yield app.test_client()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+def test_replica_views_read_from_the_replica(routed):
+    assert routed.get('/items').get_json() == ['replica']
+
+def test_primary_consistency_reads_from_the_primary(routed):
+    assert routed.get('/items?consistency=primary').get_json() == ['primary']
+    assert routed.get('/items', headers={'X-Read-Consistency': 'primary'}).get_json() == ['primary']
+    assert routed.get('/items/primary').get_json() == ['primary']
+
+def test_writes_go_to_the_primary_and_pin_later_reads(routed, monkeypatch):
+    # The write and the read after it in the same request use the primary
+    assert routed.post('/items').get_json() == ['primary', 'new']
+
+    now = replica.time.time()
+    assert routed.get('/items').get_json() == ['primary', 'new']
+
+    # Once the sticky window has passed, reads go back to the replica
+    monkeypatch.setattr(replica.time, 'time', lambda: now + 11)
+    assert routed.get('/items').get_json() == ['replica']
+
+def test_other_clients_are_not_pinned(routed):
+    routed.post('/items')
+
+    assert routed.application.test_client().get('/items').get_json() == ['replica']
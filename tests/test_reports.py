@@ -0,0 +1,33 @@
+import time
+from datetime import date
+
+import pytest
+
+from report_jobs import report_queue, write_json
+from reports import financial_spec, financial_summary
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_queue, 'directory', str(tmp_path))
+    return tmp_path
+
+def test_finished_job_is_shown_without_resolving_the_spec(logist_client, jobs_dir, monkeypatch):
+    # A range ending today: its fingerprint changes with every new order
+    spec = financial_spec(date(2025, 1, 1), date.today())
+    result = dict(financial_summary(spec), total_orders=4242)
+    write_json(str(jobs_dir / 'abc123.json'), {
+        'id': 'abc123', 'spec': spec, 'status': 'done', 'result': result,
+        'submitted_at': time.time(), 'finished_at': time.time(),
+    })
+
+    def submit(*args):
+        raise AssertionError('the finished job must not be resubmitted')
+    monkeypatch.setattr(report_queue, 'submit', submit)
+
+    response = logist_client.get('/admin/financial_reports?job=abc123')
+
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert '4242' in page
+    assert 'value="2025-01-01"' in page
+    assert 'id="reportJob"' not in page
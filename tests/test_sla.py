@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from models import Order
+from sla import sweep_overdue
+
+TODAY = date(2030, 3, 4)
+YESTERDAY = TODAY - timedelta(days=1)
+UPDATED = datetime(2030, 1, 1, 12, 0)
+
+def flags(order_id):
+    db.session.expire_all()
+    order = db.session.get(Order, order_id)
+    return order.pickup_overdue_at is not None, order.delivery_overdue_at is not None
+
+def test_sweep_flags_late_pickups_and_deliveries(make_order):
+    late_pickup = make_order(status='new', scheduled_pickup_date=YESTERDAY, updated_at=UPDATED).id
+    late_delivery = make_order(status='in_progress', scheduled_pickup_date=YESTERDAY,
+                               scheduled_delivery_date=YESTERDAY, updated_at=UPDATED).id
+    due_today = make_order(status='confirmed', scheduled_pickup_date=TODAY, scheduled_delivery_date=TODAY).id
+    delivered = make_order(status='delivered', scheduled_pickup_date=YESTERDAY,
+                           scheduled_delivery_date=YESTERDAY).id
+    unscheduled = make_order(status='new').id
+
+    pickups, deliveries, cleared = sweep_overdue(TODAY, notify=False)
+
+    assert [p['id'] for p in pickups] == [late_pickup]
+    assert [d['id'] for d in deliveries] == [late_delivery]
+    assert cleared == 0
+    assert flags(late_pickup) == (True, False)
+    assert flags(late_delivery) == (False, True)
+    for order_id in (due_today, delivered, unscheduled):
+        assert flags(order_id) == (False, False)
+
+def test_sweep_is_idempotent_and_keeps_updated_at(make_order):
+    order_id = make_order(status='new', scheduled_pickup_date=YESTERDAY, updated_at=UPDATED).id
+    sweep_overdue(TODAY, notify=False)
+    db.session.expire_all()
+    flagged_at = db.session.get(Order, order_id).pickup_overdue_at
+
+    assert sweep_overdue(TODAY, notify=False) == ([], [], 0)
+
+    order = db.session.get(Order, order_id)
+    assert order.pickup_overdue_at == flagged_at
+    assert order.updated_at == UPDATED
+
+def test_sweep_clears_flags_of_rescheduled_orders(make_order):
+    order_id = make_order(status='new', scheduled_pickup_date=YESTERDAY, updated_at=UPDATED).id
+    sweep_overdue(TODAY, notify=False)
+    # Rescheduled by a bulk write, which the before_flush hook does not see
+    db.session.execute(update(Order).where(Order.id == order_id).values(scheduled_pickup_date=TODAY, updated_at=UPDATED))
+    db.session.commit()
+
+    assert sweep_overdue(TODAY, notify=False) == ([], [], 1)
+
+    assert flags(order_id) == (False, False)
+    assert db.session.get(Order, order_id).updated_at == UPDATED
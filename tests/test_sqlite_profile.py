@@ -0,0 +1,14 @@
+from flask import g
+
+from sqlite_profile import begin_statement
+
+def test_writes_outside_requests_take_the_write_lock(app):
+    assert begin_statement() == 'BEGIN IMMEDIATE'
+
+def test_read_only_requests_stay_deferred(app):
+    with app.test_request_context('/', method='GET'):
+        assert begin_statement() == 'BEGIN'
+    with app.test_request_context('/', method='POST'):
+        assert begin_statement() == 'BEGIN IMMEDIATE'
+        g.read_only_transactions = True
+        assert begin_statement() == 'BEGIN'
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+import tariffs
+from app import db
+from models import Order, Tariff
+from tariffs import get_tariff_table, quote_order, reprice_orders
+
+@pytest.fixture
+def test_tariff(app):
+    tariff = Tariff(order_type='test', zone='city', max_weight=None, base_price=1000, price_per_kg=0)
+    db.session.add(tariff)
+    db.session.commit()
+    yield tariff
+    Tariff.query.filter_by(order_type='test').delete()
+    db.session.commit()
+    tariffs.reload_tariffs()
+
+def test_table_follows_tariff_edits(test_tariff, monkeypatch):
+    assert get_tariff_table().quote('test', 'city', 10, None) == 1000
+
+    # Another process edits the tariff; this worker sees it after the interval
+    db.session.execute(
+        Tariff.__table__.update().where(Tariff.id == test_tariff.id)
+        .values(base_price=2000, updated_at=datetime(2100, 1, 1))
+    )
+    db.session.commit()
+    assert get_tariff_table().quote('test', 'city', 10, None) == 1000
+
+    monkeypatch.setattr(tariffs, 'VERSION_CHECK_INTERVAL', 0)
+    assert get_tariff_table().quote('test', 'city', 10, None) == 2000
+
+def test_reprice_writes_only_changed_quotes(make_order):
+    current = make_order(cargo_weight=10)
+    current_quote = quote_order(current)
+    current.quoted_price = current_quote
+    stale = make_order(cargo_weight=10, quoted_price=1)
+    db.session.commit()
+    old = datetime(2020, 1, 1)
+    db.session.execute(Order.__table__.update().values(updated_at=old))
+    db.session.commit()
+
+    assert reprice_orders() == 1
+
+    db.session.expire_all()
+    assert current.updated_at == old
+    assert stale.quoted_price == current_quote
+    assert stale.updated_at > old